@@ -1,5 +1,7 @@
 import os
+import time
 import logging
+import threading
 
 from six.moves import xrange
 
@@ -14,6 +16,8 @@ from virttest.libvirt_xml.vm_xml import VMXML, VMCPUXML, VMPMXML
 from virttest.libvirt_xml.network_xml import NetworkXML, IPXML
 from virttest.libvirt_xml.devices import interface
 
+from provider import bench_helper
+
 
 def run_destroy_console(params, libvirtd, vm):
     """
@@ -122,7 +126,8 @@ def run_job_acquire(params, libvirtd, vm):
     vm.start()
     res = virsh.qemu_monitor_command(vm.name, 'info block', '--hmp')
     logging.debug(res)
-    save_path = os.path.join(data_dir.get_tmp_dir(), 'tmp.save')
+    # One file per domain as the soak test saves the domains concurrently
+    save_path = os.path.join(data_dir.get_tmp_dir(), '%s.save' % vm.name)
     virsh.save(vm.name, save_path)
     vm.wait_for_shutdown()
 
@@ -131,7 +136,7 @@ def post_job_acquire(params, libvirtd, vm):
     """
     Cleanup for test job_acquire
     """
-    save_path = os.path.join(data_dir.get_tmp_dir(), 'tmp.save')
+    save_path = os.path.join(data_dir.get_tmp_dir(), '%s.save' % vm.name)
     if os.path.exists(save_path):
         os.remove(save_path)
 
@@ -231,9 +236,135 @@ def run_restart_firewalld(params, libvirtd, vm):
     libvirtd.cont()
 
 
+def soak_worker(params, libvirtd, vm, scenarios, offset, stop_event,
+                recorder, failures):
+    """
+    Run the scenarios in turn against one domain until stop_event is set.
+
+    :param scenarios: Names of the scenarios, without 'run_' prefix
+    :param offset: Index of the first scenario, so that the workers do not
+                   run the same scenario at the same time
+    :param stop_event: threading.Event to stop the loop
+    :param recorder: LatencyRecorder of the scenarios
+    :param failures: LatencyRecorder of the failed iterations, shared by
+                     all the workers
+    """
+    index = offset
+    while not stop_event.is_set():
+        name = scenarios[index % len(scenarios)]
+        index += 1
+        start = time.time()
+        try:
+            globals()['run_' + name](params, libvirtd, vm)
+            if 'post_' + name in globals():
+                globals()['post_' + name](params, libvirtd, vm)
+        except Exception as detail:
+            # Scenarios may fail when they race each other, only the
+            # daemon crashing or hanging fails the soak test
+            logging.debug("Scenario %s on %s failed: %s", name, vm.name,
+                          detail)
+            failures.record(name, time.time() - start)
+        recorder.record(name, time.time() - start)
+
+
+def probe_libvirtd(libvirtd, hang_timeout):
+    """
+    Check that libvirtd is alive and responding.
+
+    :param libvirtd: LibvirtdSession object
+    :param hang_timeout: Seconds a response may take before libvirtd is
+                         considered hung
+    :return: Tuple of (failure, response_time), failure is None if
+             libvirtd is healthy
+    """
+    if libvirtd.pid is None or not os.path.exists("/proc/%s" % libvirtd.pid):
+        return "libvirtd process %s is gone" % libvirtd.pid, None
+    start = time.time()
+    result = virsh.version(ignore_status=True, timeout=hang_timeout)
+    response_time = time.time() - start
+    if result.exit_status or response_time >= hang_timeout:
+        return ("libvirtd does not respond in %ss: %s"
+                % (hang_timeout, result.stderr.strip())), response_time
+    return None, response_time
+
+
+def run_soak(test, params, env, libvirtd):
+    """
+    Run the scenarios repeatedly and concurrently against all the domains
+    for soak_duration seconds while probing libvirtd for crashes and hangs.
+
+    :return: Reason of the failure, None if libvirtd survived
+    """
+    scenarios = params.get("soak_scenarios", "cpu_compare").split()
+    duration = float(params.get("soak_duration", 600))
+    probe_interval = float(params.get("soak_probe_interval", 1))
+    hang_timeout = float(params.get("soak_hang_timeout", 30))
+    results_file = params.get("soak_results_file", "crash_soak.json")
+    vms = env.get_all_vms()
+    if len(vms) < 2:
+        test.cancel("Soak needs at least 2 domains in vms to run the "
+                    "scenarios concurrently, got %s"
+                    % [vm.name for vm in vms])
+    # The scenarios start the domains themselves
+    for vm in vms:
+        if vm.is_alive():
+            vm.destroy()
+
+    recorder = bench_helper.LatencyRecorder()
+    failures = bench_helper.LatencyRecorder()
+    stop_event = threading.Event()
+    workers = [threading.Thread(target=soak_worker,
+                                args=(params, libvirtd, vm, scenarios, index,
+                                      stop_event, recorder, failures))
+               for index, vm in enumerate(vms)]
+    failure = None
+    start = time.time()
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    try:
+        while time.time() - start < duration:
+            if libvirtd.wait_for_stop(timeout=probe_interval):
+                failure = ("libvirtd stops with %s"
+                           % libvirtd.bundle['stop-info'])
+                break
+            failure, response_time = probe_libvirtd(libvirtd, hang_timeout)
+            if failure:
+                break
+            recorder.record("probe", response_time)
+    finally:
+        elapsed = time.time() - start
+        stop_event.set()
+    if failure is None:
+        for worker in workers:
+            worker.join()
+
+    # The probes are not iterations of the scenarios
+    results = recorder.results(elapsed, operations=scenarios)
+    iterations = recorder.count(operations=scenarios)
+    results.update({'scenarios': scenarios,
+                    'domains': [vm.name for vm in vms],
+                    'iterations': iterations,
+                    'iterations_per_second': iterations / elapsed,
+                    'errors': dict((name, failures.count(name))
+                                   for name in scenarios),
+                    'failure': failure,
+                    'time_to_failure': elapsed if failure else None})
+    bench_helper.write_results(test, results_file, results)
+    logging.info("Ran %d iterations of %s on %d domains in %.1fs, "
+                 "%.2f iterations/s", iterations, scenarios, len(vms),
+                 elapsed, results['iterations_per_second'])
+    if failure:
+        logging.error("libvirtd failed after %.1fs: %s", elapsed, failure)
+    return failure
+
+
 def run(test, params, env):
     """
     Run various regression tests and check whether libvirt daemon crashes.
+
+    With soak, run the scenarios concurrently against all the domains for
+    a while and check whether libvirt daemon crashes or hangs.
     """
     func_name = 'run_' + params.get("func_name", "default")
     post_func_name = 'post_' + params.get("func_name", "default")
@@ -252,6 +383,16 @@ def run(test, params, env):
     try:
         libvirtd.start()
 
+        if params.get("soak") == "yes":
+            failure = run_soak(test, params, env, libvirtd)
+            if failure:
+                if libvirtd.wait_for_stop(timeout=0):
+                    logging.debug('Backtrace:')
+                    for line in libvirtd.back_trace():
+                        logging.debug(line)
+                test.fail(failure)
+            return
+
         run_func = globals()[func_name]
         for i in xrange(repeat):
             run_func(params, libvirtd, vm)
@@ -1,28 +1,176 @@
+import time
 import logging
-import difflib
 
 from aexpect import ExpectTimeoutError
 from aexpect import ShellTimeoutError
 
+from virttest import data_dir
 from virttest import utils_libvirtd
 from virttest import utils_misc
 from virttest import remote
+from virttest import virsh
 from virttest.libvirt_xml import VMXML
 from virttest.libvirt_xml.xcepts import LibvirtXMLNotFoundError
 
+from provider import bench_helper
+from provider import overlay_guest
+from provider import xml_consistency
+
+
+def agent_connected(vm_name):
+    """
+    Check if the agent channel of a domain is connected.
+    """
+    ga_tgt = VMXML.new_from_dumpxml(vm_name).get_section_string(
+        '/devices/channel/target')
+    return 'state="connected"' in ga_tgt
+
+
+def wait_domain_recovered(vm_name, start, wait_agent, timeout):
+    """
+    Wait until a domain is queryable and running after libvirtd restart.
+
+    :param vm_name: Name of the domain
+    :param start: Time libvirtd was started at
+    :param wait_agent: Wait for the agent channel to be connected as well
+    :param timeout: Seconds to wait
+    :return: Dict like {'queryable': 1.0, 'agent': 5.0} with the seconds
+             from start, None for the states not reached
+    """
+    recovered = {'queryable': None, 'agent': None}
+    while time.time() - start < timeout:
+        if recovered['queryable'] is None:
+            result = virsh.domstate(vm_name, ignore_status=True)
+            if not result.exit_status and "running" in result.stdout:
+                recovered['queryable'] = time.time() - start
+        if recovered['queryable'] is not None:
+            if not wait_agent:
+                break
+            try:
+                if agent_connected(vm_name):
+                    recovered['agent'] = time.time() - start
+                    break
+            except Exception as detail:
+                logging.debug("Failed to check agent of %s: %s",
+                              vm_name, detail)
+        time.sleep(0.1)
+    return recovered
+
+
+def run_recovery_bench(test, params, env):
+    """
+    Measure how long libvirtd takes to recover N running guests after
+    restart, for each N in recovery_guest_counts.
+    """
+    vm = env.get_vm(params.get('main_vm'))
+    guest_counts = [int(count) for count in
+                    params.get("recovery_guest_counts", "10").split()]
+    wait_agent = params.get("recovery_wait_agent", "yes") == "yes"
+    boot_timeout = int(params.get("recovery_boot_timeout", 600))
+    timeout = int(params.get("recovery_timeout", 600))
+    concurrency = int(params.get("recovery_concurrency", 32))
+    check_xml = params.get("recovery_check_xml", "yes") == "yes"
+    xml_ignore = xml_consistency.parse_ignore(params.get("xml_ignore"))
+    results_file = params.get("recovery_results_file",
+                              "restart_recovery.json")
+
+    if vm.is_alive():
+        vm.destroy()
+    vmxml = VMXML.new_from_inactive_dumpxml(vm.name)
+    tmp_dir = data_dir.get_tmp_dir()
+    libvirtd = utils_libvirtd.Libvirtd()
+    guests = []
+    overlays = []
+    results = []
+    try:
+        for count in sorted(guest_counts):
+            overlay_guest.create_overlay_guests(vmxml, count, tmp_dir,
+                                                guests, overlays)
+            try:
+                if wait_agent and not utils_misc.wait_for(
+                        lambda: all(agent_connected(name) for name in guests),
+                        boot_timeout, step=5):
+                    test.error("Agent channels of %d guests are not "
+                               "connected in %ss" % (count, boot_timeout))
+            except LibvirtXMLNotFoundError:
+                # The guests have no agent channel to wait for
+                logging.warning("No agent channel in %s, not waiting for "
+                                "the agents", vm.name)
+                wait_agent = False
+
+            if check_xml:
+                xml_before = xml_consistency.snapshot(
+                    guests, ignore=xml_ignore, concurrency=concurrency)
+            libvirtd.stop()
+            start = time.time()
+            libvirtd.start()
+            first_response = None
+            while time.time() - start < timeout:
+                if not virsh.version(ignore_status=True).exit_status:
+                    first_response = time.time() - start
+                    break
+                time.sleep(0.1)
+            if first_response is None:
+                test.fail("libvirtd does not respond in %ss after start"
+                          % timeout)
+            recovered = bench_helper.run_in_parallel(
+                wait_domain_recovered,
+                [(name, start, wait_agent, timeout) for name in guests],
+                concurrency)
+
+            not_recovered = [name for name, state in zip(guests, recovered)
+                             if state['queryable'] is None or
+                             (wait_agent and state['agent'] is None)]
+            if not_recovered:
+                test.fail("Guests %s are not recovered in %ss after "
+                          "libvirtd restart" % (not_recovered, timeout))
+            if check_xml:
+                changed = xml_consistency.compare(
+                    xml_before, xml_consistency.snapshot(
+                        guests, ignore=xml_ignore, concurrency=concurrency))
+                if changed:
+                    for name in sorted(changed):
+                        logging.error("XML of %s changed:\n%s", name,
+                                      changed[name])
+                    test.fail("XML of %d guests changed after libvirtd "
+                              "restart: %s" % (len(changed), sorted(changed)))
+            queryable = [state['queryable'] for state in recovered]
+            result = {'guests': count,
+                      'first_response': first_response,
+                      'all_queryable': max(queryable),
+                      'queryable_p50': bench_helper.percentile(queryable, 50),
+                      'queryable_p99': bench_helper.percentile(queryable, 99)}
+            if wait_agent:
+                result['all_agents'] = max(state['agent']
+                                           for state in recovered)
+            results.append(result)
+            logging.info("%d guests: first API response in %.2fs, all "
+                         "queryable in %.2fs, all agents in %s s", count,
+                         first_response, result['all_queryable'],
+                         result.get('all_agents'))
+
+        logging.info("%8s %16s %14s %12s", "guests", "first_response(s)",
+                     "all_queryable(s)", "all_agents(s)")
+        for result in results:
+            logging.info("%8d %16.2f %14.2f %12s", result['guests'],
+                         result['first_response'], result['all_queryable'],
+                         result.get('all_agents'))
+    finally:
+        if results:
+            bench_helper.write_results(test, results_file, results)
+        overlay_guest.remove_overlay_guests(guests, overlays)
+
 
 def run(test, params, env):
     """
     Restart libvirtd and check the consistent of VM states.
-    """
 
-    def agent_connected():
-        """
-        Callback function to check if agent channel connected.
-        """
-        ga_tgt = VMXML.new_from_dumpxml(vm_name).get_section_string(
-            '/devices/channel/target')
-        return 'state="connected"' in ga_tgt
+    With restart_recovery, measure the time libvirtd takes to recover
+    different numbers of running guests after restart instead.
+    """
+    if params.get("restart_recovery") == "yes":
+        run_recovery_bench(test, params, env)
+        return
 
     vm_name = params.get('main_vm')
     vm = env.get_vm(vm_name)
@@ -31,13 +179,13 @@ def run(test, params, env):
 
     # Wait guest agent channel to be connected to avoid XML differ
     try:
-        if not utils_misc.wait_for(agent_connected, 60):
+        if not utils_misc.wait_for(lambda: agent_connected(vm_name), 60):
             logging.warning('Agent channel not connected')
     except LibvirtXMLNotFoundError:
         pass
 
-    vm_xml = VMXML.new_from_dumpxml(vm_name)
-    logging.debug(vm_xml)
+    xml_ignore = xml_consistency.parse_ignore(params.get("xml_ignore"))
+    xml_before = xml_consistency.snapshot([vm_name], ignore=xml_ignore)
 
     # Skip the test when serial login is not available
     try:
@@ -66,21 +214,15 @@ def run(test, params, env):
 
     # Wait guest agent channel to be reconnected to avoid XML differ
     try:
-        if not utils_misc.wait_for(agent_connected, 30):
+        if not utils_misc.wait_for(lambda: agent_connected(vm_name), 30):
             logging.warning('Agent channel not recovered after libvirtd '
                             'restart')
     except LibvirtXMLNotFoundError:
         pass
 
     # Check whether domain XML changed
-    vm_xml_new = VMXML.new_from_dumpxml(vm_name)
-    if str(vm_xml) != str(vm_xml_new):
-        diff_txt = '\n'.join(
-            difflib.unified_diff(
-                str(vm_xml).splitlines(),
-                str(vm_xml_new).splitlines(),
-                lineterm='',
-            )
-        )
+    changed = xml_consistency.compare(
+        xml_before, xml_consistency.snapshot([vm_name], ignore=xml_ignore))
+    if changed:
         test.fail("XML changed after libvirtd restart:\n%s"
-                  % diff_txt)
+                  % changed[vm_name])
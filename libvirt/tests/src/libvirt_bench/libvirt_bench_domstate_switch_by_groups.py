@@ -1,61 +1,91 @@
-from avocado.core import exceptions
+import time
+import logging
 
 from virttest import utils_test
 
+from provider import bench_helper
+from provider import event_watcher
+from provider import virsh_pool
+
 
 def run(test, params, env):
     """
     Test steps:
 
     1) Get the params from params.
-    2) Divide vms into two groups and run sub test for each group.
-    3) clean up.
+    2) Divide vms into groups and run sub test for each group
+       concurrently.
+    3) Report the latency of each operation and the throughput.
+    4) clean up.
     """
     # Get VMs.
     vms = env.get_all_vms()
-    if len(vms) < 2:
-        test.cancel("We need at least 2 vms for this test.")
     timeout = params.get("LB_domstate_switch_loop_time", 600)
-    # Divide vms into two groups.
-    odd_group_vms = []
-    even_group_vms = []
-    for index in range(len(vms)):
-        if (index % 2):
-            even_group_vms.append(vms[index])
-        else:
-            odd_group_vms.append(vms[index])
-
-    # Run sub test for odd_group_vms.
-    odd_env = env.copy()
-    # Unregister vm which belong to even_group from odd_env.
-    for vm in even_group_vms:
-        odd_env.unregister_vm(vm.name)
-    odd_bt = utils_test.BackgroundTest(utils_test.run_virt_sub_test,
-                                       params=[test, params, odd_env,
-                                               "libvirt_bench_domstate_switch_in_loop"])
-    odd_bt.start()
-
-    # Run sub test for even_group_vms.
-    even_env = env.copy()
-    # Unregister vm which belong to odd_group from even_env.
-    for vm in odd_group_vms:
-        even_env.unregister_vm(vm.name)
-    even_bt = utils_test.BackgroundTest(utils_test.run_virt_sub_test,
-                                        params=[test, params, even_env,
-                                                "libvirt_bench_domstate_switch_in_loop"])
-    even_bt.start()
+    # Number of groups, "per_vm" means one group for each vm.
+    groups = params.get("LB_domstate_switch_groups", "2")
+    if groups == "per_vm":
+        groups = len(vms)
+    groups = int(groups)
+    if groups < 2 or len(vms) < groups:
+        test.cancel("We need at least %s vms for this test, but got %s." %
+                    (max(groups, 2), len(vms)))
+    # Divide vms into groups.
+    group_vms = [vms[index::groups] for index in range(groups)]
 
-    # Wait for background_tests joining.
+    buckets = bench_helper.parse_buckets(
+        params.get("LB_domstate_switch_histogram_buckets"))
+    results_file = params.get("LB_domstate_switch_results_file",
+                              "domstate_switch_results.json")
+    recorder = bench_helper.LatencyRecorder()
+    # All the groups share one pool of virsh sessions, by default
+    # one session for each group.
+    pool = virsh_pool.VirshSessionPool(
+        int(params.get("LB_virsh_pool_size", groups)))
+    # All the groups share one event watcher in event mode.
+    watcher = None
+    background_tests = []
     err_msg = ""
+    start_time = time.time()
     try:
-        odd_bt.join(int(timeout) * 2)
-    except exceptions.TestFail as detail:
-        err_msg += ("Group odd_group failed to run sub test.\n"
-                    "Detail: %s." % detail)
-    try:
-        even_bt.join(int(timeout) * 2)
-    except exceptions.TestFail as detail:
-        err_msg += ("Group even_group failed to run sub test.\n"
-                    "Detail: %s." % detail)
+        if "yes" == params.get("LB_domstate_switch_verify_by_event", "no"):
+            watcher = event_watcher.DomainEventWatcher(event="lifecycle")
+            watcher.start()
+        for index, vms_in_group in enumerate(group_vms):
+            group_env = env.copy()
+            # Unregister vm which does not belong to this group.
+            for vm in vms:
+                if vm not in vms_in_group:
+                    group_env.unregister_vm(vm.name)
+            # All the groups share one recorder.
+            group_env["LB_domstate_switch_recorder"] = recorder
+            group_env["LB_domstate_switch_event_watcher"] = watcher
+            group_env["LB_virsh_pool"] = pool
+            logging.debug("Group %s: %s", index,
+                          [vm.name for vm in vms_in_group])
+            bt = utils_test.BackgroundTest(utils_test.run_virt_sub_test,
+                                           params=[test, params, group_env,
+                                                   "libvirt_bench_domstate_switch_in_loop"])
+            bt.start()
+            background_tests.append(bt)
+
+        # Wait for background_tests joining.
+        for index, bt in enumerate(background_tests):
+            try:
+                bt.join(int(timeout) * 2)
+            except Exception as detail:
+                err_msg += ("Group %s failed to run sub test.\n"
+                            "Detail: %s.\n" % (index, detail))
+    finally:
+        elapsed = time.time() - start_time
+        if watcher is not None:
+            watcher.stop()
+        pool.close()
+    # Only the lifecycle operations count in the throughput, not their
+    # verification by domstate or events
+    operations = list(event_watcher.OPERATION_EVENTS)
+    recorder.report(elapsed, operations)
+    results = recorder.results(elapsed, buckets, operations)
+    results['groups'] = groups
+    bench_helper.write_results(test, results_file, results)
     if err_msg:
         test.fail(err_msg)
@@ -5,6 +5,10 @@ from avocado.core import exceptions
 
 from virttest import virsh
 
+from provider import bench_helper
+from provider import event_watcher
+from provider import virsh_pool
+
 
 def run(test, params, env):
     """
@@ -32,23 +36,72 @@ def run(test, params, env):
         vm_names = []
         for vm in vms:
             vm_names.append(vm.name)
+        operation = virsh_func.__name__
+        expected_event = event_watcher.OPERATION_EVENTS.get(operation)
+        by_event = (state_list is not None and watcher is not None and
+                    expected_event)
+        op_starts = {}
         for vm_name in vm_names:
-            cmd_result = virsh_func(vm_name)
+            op_starts[vm_name] = time.time()
+            cmd_result = recorder.timed(operation, pool.call, operation,
+                                        vm_name)
             if cmd_result.exit_status:
                 test.fail(cmd_result)
-            if state_list is None:
+            if state_list is None or by_event:
                 continue
-            actual_state = virsh.domstate(vm_name).stdout.strip()
+            actual_state = recorder.timed(
+                "%s_domstate" % operation,
+                pool.call, "domstate", vm_name).stdout.strip()
             if actual_state not in state_list:
                 test.fail("Command %s succeed, but the state is %s,"
                           "but not %s." %
-                          (virsh_func.__name__, actual_state,
-                           str(state_list)))
-        logging.debug("Operation %s on %s succeed.",
-                      virsh_func.__name__, vm_names)
+                          (operation, actual_state, str(state_list)))
+        # Wait for the events only after the operation is issued to all
+        # the vms, so that the guests e.g. shut down in parallel as in
+        # domstate mode instead of one after another.
+        if by_event:
+            for vm_name in vm_names:
+                op_start = op_starts[vm_name]
+                event = watcher.wait_for(vm_name, "lifecycle",
+                                         expected_event, since=op_start,
+                                         timeout=event_timeout)
+                if event is None:
+                    test.fail("Command %s succeed, but no %s event of %s "
+                              "in %ss." % (operation, expected_event,
+                                           vm_name, event_timeout))
+                # Time from issuing the command to receiving the event.
+                recorder.record("%s_event" % operation,
+                                event.time - op_start)
+        logging.debug("Operation %s on %s succeed.", operation, vm_names)
 
     # Get VMs.
     vms = env.get_all_vms()
+    # Use the recorder shared by the parent test if there is one.
+    recorder = env.get("LB_domstate_switch_recorder")
+    report_latency = recorder is None
+    if report_latency:
+        recorder = bench_helper.LatencyRecorder()
+    # Get the histogram buckets and the results file.
+    buckets = bench_helper.parse_buckets(
+        params.get("LB_domstate_switch_histogram_buckets"))
+    results_file = params.get("LB_domstate_switch_results_file",
+                              "domstate_switch_results.json")
+    # Run virsh commands through the pool shared by the parent test
+    # if there is one.
+    pool = env.get("LB_virsh_pool")
+    close_pool = pool is None
+    if close_pool:
+        pool = virsh_pool.VirshSessionPool(
+            int(params.get("LB_virsh_pool_size", "0")))
+    # Verify the states by lifecycle events instead of virsh domstate.
+    verify_by_event = ("yes" == params.get(
+        "LB_domstate_switch_verify_by_event", "no"))
+    event_timeout = int(params.get("LB_domstate_switch_event_timeout", "240"))
+    watcher = env.get("LB_domstate_switch_event_watcher")
+    stop_watcher = verify_by_event and watcher is None
+    if stop_watcher:
+        watcher = event_watcher.DomainEventWatcher(event="lifecycle")
+        watcher.start()
     # Get operations from params.
     start_in_loop = ("yes" == params.get("LB_domstate_switch_start", "no"))
     start_post_state = params.get("LB_domstate_switch_start_post_state",
@@ -72,6 +125,7 @@ def run(test, params, env):
     end_time = current_time + loop_time
     # Init a counter for the loop.
     loop_counter = 0
+    start_time = time.time()
     try:
         try:
             # Verify the vms is all loaded completely.
@@ -107,6 +161,19 @@ def run(test, params, env):
             test.fail("Succeed for %s loop, and got an error.\n"
                       "Detail: %s." % (loop_counter, detail))
     finally:
+        if stop_watcher:
+            watcher.stop()
+        if close_pool:
+            pool.close()
+        if report_latency:
+            elapsed = time.time() - start_time
+            # Only the lifecycle operations count in the throughput, not
+            # their verification by domstate or events
+            operations = list(event_watcher.OPERATION_EVENTS)
+            recorder.report(elapsed, operations)
+            results = recorder.results(elapsed, buckets, operations)
+            results['loops'] = loop_counter
+            bench_helper.write_results(test, results_file, results)
         # Resume vm if vm is paused.
         for vm in vms:
             if vm.is_paused():
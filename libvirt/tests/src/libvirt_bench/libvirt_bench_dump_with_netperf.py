@@ -5,6 +5,8 @@ from virttest import utils_test
 from virttest import utils_misc
 from virttest import data_dir
 
+from provider import dump_bench
+
 
 def run(test, params, env):
     """
@@ -12,8 +14,9 @@ def run(test, params, env):
 
     1) Get the params from params.
     2) Run netperf on guest.
-    3) Dump each VM and check result.
-    3) Clean up.
+    3) Dump each VM and check result, or with dump_bench, dump the VMs
+       concurrently with several option sets and report the dump cost.
+    4) Clean up.
     """
     vms = env.get_all_vms()
     netperf_control_file = params.get("netperf_controle_file",
@@ -49,6 +52,9 @@ def run(test, params, env):
     logging.debug("Netperf is already running in VMs.")
 
     try:
+        if params.get("dump_bench") == "yes":
+            dump_bench.run_dump_bench(test, params, vms)
+            return
         dump_path = os.path.join(data_dir.get_tmp_dir(), "dump_file")
         for vm in vms:
             vm.dump(dump_path)
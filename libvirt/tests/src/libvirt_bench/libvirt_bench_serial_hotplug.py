@@ -5,13 +5,14 @@ import subprocess
 import time
 import shutil
 
-from virttest import virsh
 from virttest import libvirt_vm
 from virttest import utils_test
 from virttest import utils_misc
 from virttest.utils_test import libvirt as utlv
 from virttest import data_dir
 
+from provider import virsh_pool
+
 
 def run(test, params, env):
     """
@@ -25,6 +26,8 @@ def run(test, params, env):
     load_params = params.get("load_params", "")
     test_count = int(params.get("test_count", 5))
     test_type = params.get("test_type", "multi")
+    pool = virsh_pool.VirshSessionPool(
+        int(params.get("LB_virsh_pool_size", "0")))
 
     tmp_dir = os.path.join(data_dir.get_tmp_dir(), "hotplug_serial_load")
     if not os.path.exists(tmp_dir):
@@ -79,18 +82,18 @@ def run(test, params, env):
                 char_add_opt += "pty,path=/dev/pts/%s,id=pty%s" % (id, index)
                 dev_add_opt += ("pty%s,name=pty%s,bus=virtio-serial0.0,id=pty%s"
                                 % (index, index, index))
-            virsh.qemu_monitor_command(vm_name, char_add_opt, "--hmp")
-            virsh.qemu_monitor_command(vm_name, dev_add_opt, "--hmp")
+            pool.call("qemu_monitor_command", vm_name, char_add_opt, "--hmp")
+            pool.call("qemu_monitor_command", vm_name, dev_add_opt, "--hmp")
         elif hotplug_type == "attach":
             xml_file = "%s/xml_%s%s" % (tmp_dir, char_dev, index)
             if char_dev in ["file", "socket"]:
                 prepare_channel_xml(xml_file, char_dev, index)
             elif char_dev == "pty":
                 prepare_channel_xml(xml_file, char_dev, index, id)
-            virsh.attach_device(vm_name, xml_file, flagstr="--live")
+            pool.call("attach_device", vm_name, xml_file, flagstr="--live")
 
     def confirm_hotplug_result(char_dev, index=1, id=0):
-        result = virsh.qemu_monitor_command(vm_name, "info qtree", "--hmp")
+        result = pool.call("qemu_monitor_command", vm_name, "info qtree", "--hmp")
         h_o = result.stdout.strip()
         chardev_c = h_o.count("chardev = %s%s" % (char_dev, index))
         name_c = h_o.count("name = \"%s%s\"" % (char_dev, index))
@@ -133,15 +136,15 @@ def run(test, params, env):
         if hotplug_type == "qmp":
             del_dev_opt = "device_del %s%s" % (char_dev, index)
             del_char_opt = "chardev-remove %s%s" % (char_dev, index)
-            virsh.qemu_monitor_command(vm_name, del_dev_opt, "--hmp")
-            virsh.qemu_monitor_command(vm_name, del_char_opt, "--hmp")
+            pool.call("qemu_monitor_command", vm_name, del_dev_opt, "--hmp")
+            pool.call("qemu_monitor_command", vm_name, del_char_opt, "--hmp")
         elif hotplug_type == "attach":
             xml_file = "%s/xml_%s%s" % (tmp_dir, char_dev, index)
-            virsh.detach_device(vm_name, xml_file, flagstr="--live")
+            pool.call("detach_device", vm_name, xml_file, flagstr="--live")
 
     def confirm_unhotplug_result(char_dev, index=1):
         serial_file = "/dev/virtio-ports/%s%s" % (char_dev, index)
-        result = virsh.qemu_monitor_command(vm_name, "info qtree", "--hmp")
+        result = pool.call("qemu_monitor_command", vm_name, "info qtree", "--hmp")
         uh_o = result.stdout.strip()
         if uh_o.count("chardev = %s%s" % (char_dev, index)):
             test.fail("Still can get serial device info: '%s'" % uh_o)
@@ -205,5 +208,6 @@ def run(test, params, env):
                     confirm_unhotplug_result("pty")
     finally:
         session.close()
+        pool.close()
         if os.path.exists(tmp_dir):
             shutil.rmtree(tmp_dir)
@@ -5,13 +5,14 @@ import logging
 from avocado.utils import process
 
 from virttest import data_dir
-from virttest import virsh
 from virttest import utils_test
 from virttest import utils_misc
 from virttest.libvirt_xml.vm_xml import VMXML
 from virttest.libvirt_xml.devices.disk import Disk
 from virttest.libvirt_xml.devices.input import Input
 
+from provider import virsh_pool
+
 
 def run(test, params, env):
     """
@@ -32,6 +33,8 @@ def run(test, params, env):
     control_file = params.get("control_file", None)
 
     status_error = ("yes" == params.get("status_error", "no"))
+    pool = virsh_pool.VirshSessionPool(
+        int(params.get("LB_virsh_pool_size", "0")))
 
     vm_xml = VMXML.new_from_inactive_dumpxml(vm_name)
     vm_xml_backup = vm_xml.copy()
@@ -89,28 +92,28 @@ def run(test, params, env):
                         attach_cmd = "drive_add"
                         attach_cmd += (" 0 id=drive-usb-disk%s,if=none,file=%s" % (i, path))
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if keyboard:
                         attach_cmd = "device_add"
                         attach_cmd += " usb-kdb,bus=usb1.0,id=kdb"
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if mouse:
                         attach_cmd = "device_add"
                         attach_cmd += " usb-mouse,bus=usb1.0,id=mouse"
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if tablet:
                         attach_cmd = "device_add"
                         attach_cmd += " usb-tablet,bus=usb1.0,id=tablet"
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                 else:
@@ -126,7 +129,7 @@ def run(test, params, env):
                         attributes = {'type_name': "usb", 'bus': "1", 'port': "0"}
                         disk_xml.address = disk_xml.new_disk_address(**{"attrs": attributes})
 
-                        result = virsh.attach_device(vm_name, disk_xml.xml)
+                        result = pool.call("attach_device", vm_name, disk_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if mouse:
@@ -135,7 +138,7 @@ def run(test, params, env):
                         attributes = {'type_name': "usb", 'bus': "1", 'port': "0"}
                         mouse_xml.address = mouse_xml.new_input_address(**{"attrs": attributes})
 
-                        result = virsh.attach_device(vm_name, mouse_xml.xml)
+                        result = pool.call("attach_device", vm_name, mouse_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if tablet:
@@ -144,7 +147,7 @@ def run(test, params, env):
                         attributes = {'type_name': "usb", 'bus': "1", 'port': "0"}
                         tablet_xml.address = tablet_xml.new_input_address(**{"attrs": attributes})
 
-                        result = virsh.attach_device(vm_name, tablet_xml.xml)
+                        result = pool.call("attach_device", vm_name, tablet_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if keyboard:
@@ -153,7 +156,7 @@ def run(test, params, env):
                         attributes = {'type_name': "usb", 'bus': "1", 'port': "0"}
                         kbd_xml.address = kbd_xml.new_input_address(**{"attrs": attributes})
 
-                        result = virsh.attach_device(vm_name, kbd_xml.xml)
+                        result = pool.call("attach_device", vm_name, kbd_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
 
@@ -163,45 +166,45 @@ def run(test, params, env):
                         attach_cmd = "drive_del"
                         attach_cmd += (" drive-usb-disk")
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if mouse:
                         attach_cmd = "device_del"
                         attach_cmd += (" mouse")
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if keyboard:
                         attach_cmd = "device_del"
                         attach_cmd += (" keyboard")
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if tablet:
                         attach_cmd = "device_del"
                         attach_cmd += (" tablet")
 
-                        result = virsh.qemu_monitor_command(vm_name, attach_cmd, options=options)
+                        result = pool.call("qemu_monitor_command", vm_name, attach_cmd, options=options)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                 else:
                     if disk:
-                        result = virsh.detach_device(vm_name, disk_xml.xml)
+                        result = pool.call("detach_device", vm_name, disk_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if mouse:
-                        result = virsh.detach_device(vm_name, mouse_xml.xml)
+                        result = pool.call("detach_device", vm_name, mouse_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if keyboard:
-                        result = virsh.detach_device(vm_name, kbd_xml.xml)
+                        result = pool.call("detach_device", vm_name, kbd_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
                     if tablet:
-                        result = virsh.detach_device(vm_name, tablet_xml.xml)
+                        result = pool.call("detach_device", vm_name, tablet_xml.xml)
                         if result.exit_status:
                             raise process.CmdError(result.command, result)
         except process.CmdError as e:
@@ -209,6 +212,7 @@ def run(test, params, env):
                 test.fail("failed to attach device.\n"
                           "Detail: %s." % result)
     finally:
+        pool.close()
         if os.path.isdir(tmp_dir):
             shutil.rmtree(tmp_dir)
         vm_xml_backup.sync()
@@ -0,0 +1,122 @@
+import logging
+
+from virttest import libvirt_vm
+from virttest import utils_test
+from virttest.utils_conn import TLSConnection
+
+from provider import bench_helper
+from provider import migration_bench
+
+
+def evacuate_host(test, vm_names, src_uri, dest_uri, concurrency,
+                  options, extra, timeout):
+    """
+    Migrate all the vms to the destination host and measure the cost.
+
+    :param test: avocado.core.test.Test object
+    :param vm_names: Names of the vms to evacuate
+    :param src_uri: Connect uri of the source host
+    :param dest_uri: Connect uri of the destination host
+    :param concurrency: Max number of concurrent migrations
+    :param options: Options of virsh migrate
+    :param extra: Extra arguments of virsh migrate
+    :param timeout: Seconds to wait for each virsh migrate
+    :return: Summary of migration_bench.migrate_vms with the busy CPU
+             seconds of the source host in 'cpu_time'
+    """
+    cpu_time = bench_helper.host_cpu_time()
+    summary = migration_bench.migrate_vms(vm_names, dest_uri, concurrency,
+                                          options=options, extra=extra,
+                                          src_uri=src_uri, timeout=timeout)
+    summary['cpu_time'] = bench_helper.host_cpu_time() - cpu_time
+    if summary['failed']:
+        test.fail("Failed to migrate %s with '%s %s'"
+                  % (summary['failed'], options, extra))
+    return summary
+
+
+def run(test, params, env):
+    """
+    Benchmark host evacuation with different migration options.
+
+    1) Start stress in all the vms.
+    2) For each option set, migrate all the vms to the destination host,
+       record the total time, max downtime and CPU cost on source host,
+       then migrate the vms back.
+    3) Report a comparison table of the option sets.
+    4) Clean up.
+    """
+    vms = env.get_all_vms()
+    vm_names = [vm.name for vm in vms]
+    src_uri = params.get("virsh_migrate_connect_uri", "qemu:///system")
+    dest_uri = libvirt_vm.complete_uri(params.get("migrate_dest_host",
+                                                  "EXAMPLE"))
+    if dest_uri.count('///') or dest_uri.count('EXAMPLE'):
+        test.cancel("The dest_uri '%s' is invalid" % dest_uri)
+
+    option_sets = params.get("evacuation_option_sets", "precopy").split()
+    concurrency = int(params.get("evacuation_concurrency", len(vms)))
+    timeout = int(params.get("evacuation_migrate_timeout", 1800))
+    back_options = params.get("evacuation_back_options", "--live --verbose")
+    results_file = params.get("evacuation_results_file",
+                              "evacuation_bench.json")
+    stress_in_vms = params.get("evacuation_stress_in_vms", "yes") == "yes"
+
+    migrate_setup = utils_test.libvirt.MigrationTest()
+    tls_obj = None
+    results = []
+    try:
+        if any("--tls" in params.get("evacuation_extra_%s" % name, "")
+               for name in option_sets):
+            tls_obj = TLSConnection(params)
+            tls_obj.auto_recover = True
+            tls_obj.conn_setup()
+
+        for vm in vms:
+            vm.wait_for_login().close()
+        if stress_in_vms:
+            utils_test.load_stress("stress_in_vms", params, vms=vms)
+
+        for name in option_sets:
+            options = params.get("evacuation_options_%s" % name, "--live")
+            extra = params.get("evacuation_extra_%s" % name, "")
+            logging.info("Evacuating %s with option set %s: '%s %s'",
+                         vm_names, name, options, extra)
+            summary = evacuate_host(test, vm_names, src_uri, dest_uri,
+                                    concurrency, options, extra, timeout)
+            summary['option_set'] = name
+            summary['options'] = "%s %s" % (options, extra)
+            results.append(summary)
+
+            # Migrate back so that every option set starts from source host
+            migrate_setup.migrate_pre_setup(src_uri, params)
+            try:
+                back = migration_bench.migrate_vms(vm_names, src_uri,
+                                                   concurrency,
+                                                   options=back_options,
+                                                   src_uri=dest_uri,
+                                                   timeout=timeout)
+            finally:
+                migrate_setup.migrate_pre_setup(src_uri, params,
+                                                cleanup=True)
+            if back['failed']:
+                test.fail("Failed to migrate back %s" % back['failed'])
+
+        logging.info("%-12s %10s %14s %12s %10s", "option_set", "total(s)",
+                     "max_downtime", "src_cpu(s)", "GB/s")
+        for summary in results:
+            logging.info("%-12s %10.1f %12sms %12.1f %10.3f",
+                         summary['option_set'], summary['elapsed'],
+                         summary['max_downtime'], summary['cpu_time'],
+                         summary['gbytes_per_second'])
+    finally:
+        if results:
+            bench_helper.write_results(test, results_file, results)
+        if stress_in_vms:
+            utils_test.unload_stress("stress_in_vms", params, vms)
+        for vm in vms:
+            migrate_setup.cleanup_dest_vm(vm, None, dest_uri)
+            if not vm.is_alive():
+                vm.start()
+        if tls_obj:
+            del tls_obj
@@ -42,7 +42,9 @@ from virttest.utils_net import check_listening_port_remote_by_service
 from virttest.utils_test import libvirt
 from virttest.compat_52lts import decode_to_text as to_text
 
+from provider import bench_helper
 from provider import libvirt_version
+from provider import migration_jobinfo
 
 MIGRATE_RET = False
 
@@ -1136,6 +1138,10 @@ def run(test, params, env):
     expected_domain_state = test_dict.get("expected_domain_state")
 
     check_job_info = "yes" == test_dict.get("check_job_info", "yes")
+    sample_job_info = "yes" == test_dict.get("sample_job_info", "no")
+    sample_interval = float(test_dict.get("job_info_sample_interval", 1))
+    job_info_series_file = test_dict.get("job_info_series_file",
+                                         "domjobinfo_series.json")
     check_complete_job = test_dict.get("check_complete_job", "no")
     block_ip_addr = test_dict.get("block_ip_addr")
     block_time = test_dict.get("block_time")
@@ -2414,7 +2420,19 @@ def run(test, params, env):
             test_dict['err_msg'] = None
 
         if run_migr_front:
-            migrate_vm(test, test_dict)
+            if sample_job_info:
+                sampler = migration_jobinfo.JobInfoSampler(
+                    test_dict.get("vm_name_to_migrate") or vm_name,
+                    interval=sample_interval)
+                sampler.start()
+                try:
+                    migrate_vm(test, test_dict)
+                finally:
+                    sampler.stop()
+                    bench_helper.write_results(test, job_info_series_file,
+                                               sampler.series())
+            else:
+                migrate_vm(test, test_dict)
 
         if target_vm_name:
             # Check the libvirtd service is running on both hosts.
@@ -16,6 +16,7 @@ from virttest import ceph
 from virttest.libvirt_xml import vm_xml
 from virttest.utils_test import libvirt
 
+from provider import blockjob_tracker
 from provider import libvirt_version
 
 
@@ -206,6 +207,7 @@ def run(test, params, env):
     needs_agent = "yes" == params.get("needs_agent", "yes")
     replace_vm_disk = "yes" == params.get("replace_vm_disk", "no")
     top_inactive = ("yes" == params.get("top_inactive"))
+    blockjob_timeout = int(params.get("blockjob_timeout", 600))
     with_timeout = ("yes" == params.get("with_timeout_option", "no"))
     status_error = ("yes" == params.get("status_error", "no"))
     base_option = params.get("base_option", "none")
@@ -249,6 +251,7 @@ def run(test, params, env):
     cmd_session = None
     # Prepare a blank params to confirm if delete the configure at the end of the test
     ceph_cfg = ''
+    tracker = None
     try:
         if disk_src_protocol == 'iscsi' and disk_type == 'network':
             if not libvirt_version.version_compare(1, 0, 4):
@@ -415,6 +418,11 @@ def run(test, params, env):
             check_chain_backing_files(blk_source_image, expect_backing_file)
             return
 
+        # Follow the events of the active commit job before it starts
+        if not top_inactive and vm.is_alive():
+            tracker = blockjob_tracker.BlockJobTracker(vm_name, blk_target)
+            tracker.start()
+
         # Run test case
         # Active commit does not support on rbd based disk with bug 1200726
         result = virsh.blockcommit(vm_name, blk_target,
@@ -473,6 +481,9 @@ def run(test, params, env):
                                 # to be ready to pivot, or, since 1.2.7, abort
                                 # or pivot if the job is in the process of
                                 # completing.
+                                if tracker:
+                                    tracker.wait(blockjob_timeout,
+                                                 ("ready",))
                                 continue
                             else:
                                 logging.debug("after active block commit job "
@@ -507,6 +518,9 @@ def run(test, params, env):
                         break
                     else:
                         # wait pivot after commit is synced
+                        if tracker:
+                            tracker.wait(blockjob_timeout, ("completed",),
+                                         job_required=False)
                         continue
             else:
                 logging.debug("after inactive commit the disk xml is: %s"
@@ -554,6 +568,8 @@ def run(test, params, env):
                                                   debug=True)
             libvirt.check_exit_status(cmd_result, snap_in_mirror_err)
     finally:
+        if tracker:
+            tracker.stop()
         # Remove ceph configure file if created
         if ceph_cfg:
             os.remove(ceph_cfg)
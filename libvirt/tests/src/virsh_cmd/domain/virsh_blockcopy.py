@@ -19,6 +19,8 @@ from virttest.libvirt_xml import vm_xml
 from virttest.libvirt_xml import snapshot_xml
 from virttest.utils_test import libvirt as utl
 
+from provider import blockjob_tracker
+from provider import libvirtd_log
 from provider import libvirt_version
 
 
@@ -150,45 +152,28 @@ def check_xml(vm_name, target, dest_path, blk_options):
             return False
 
 
-def finish_job(vm_name, target, timeout):
+def finish_job(vm_name, target, timeout, tracker=None):
     """
     Make sure the block copy job finish.
 
     :param vm_name: Domain name
     :param target: Domain disk target dev
     :param timeout: Timeout value of this function
+    :param tracker: Started BlockJobTracker of the job, None means
+                    tracking the job from now on
     """
-    job_time = 0
-    while job_time < timeout:
+    own_tracker = tracker is None
+    if own_tracker:
+        tracker = blockjob_tracker.BlockJobTracker(vm_name, target)
+        tracker.start()
+    try:
         # As BZ#1359679, blockjob may disappear during the process,
-        # so we need check it all the time
-        if utl.check_blockjob(vm_name, target, 'none', '0'):
-            raise exceptions.TestFail("No blockjob find for '%s'" % target)
-
-        if utl.check_blockjob(vm_name, target, "progress", "100"):
-            logging.debug("Block job progress up to 100%")
-            break
-        else:
-            job_time += 2
-            time.sleep(2)
-    if job_time >= timeout:
-        raise JobTimeout(timeout)
-
-
-def chk_libvirtd_log(file_path, pattern, log_type):
-    """
-    Check whether libvirtd log contains specific info
-    :param file_path: libvirtd log path
-    :param pattern: string, pattern to check
-    :param log_type: string, debug, error or warning
-
-    :return: True or False
-    """
-    with open(file_path) as f:
-        for line in f:
-            if pattern in line and log_type in line:
-                return True
-    return False
+        # so the tracker checks it all the time
+        if tracker.wait(timeout, ("ready",)) is None:
+            raise JobTimeout(timeout)
+    finally:
+        if own_tracker:
+            tracker.stop()
 
 
 def run(test, params, env):
@@ -317,6 +302,13 @@ def run(test, params, env):
     logging.debug("the libvirtd config file content is:\n %s" %
                   libvirtd_conf)
     libvirtd_utl.restart()
+    # Patterns checked in libvirtd log, the follower only reads the log
+    # written since the previous check
+    lock_err_pattern = ("Timed out during operation: cannot acquire state "
+                        "change lock")
+    abort_pattern = "Copy aborted"
+    log_follower = libvirtd_log.LogFollower(libvirtd_log_path,
+                                            [lock_err_pattern, abort_pattern])
 
     def check_format(dest_path, dest_extension, expect):
         """
@@ -349,10 +341,7 @@ def run(test, params, env):
         if err_msg in cmd_result.stderr:
             raise exceptions.TestFail("Hit on bug: %s" % bug_url_)
 
-        err_pattern = "Timed out during operation: cannot acquire"
-        err_pattern += " state change lock"
-        ret = chk_libvirtd_log(libvirtd_log_path, err_pattern, "error")
-        if ret:
+        if log_follower.search(lock_err_pattern, "error"):
             raise exceptions.TestFail("Hit on bug: %s" % bug_url_)
 
     def _make_snapshot():
@@ -438,6 +427,7 @@ def run(test, params, env):
     save_path = ''
     emulated_iscsi = []
     nfs_cleanup = False
+    tracker = None
     try:
         # Prepare dest_path
         tmp_file = time.strftime("%Y-%m-%d-%H.%M.%S.img")
@@ -495,6 +485,10 @@ def run(test, params, env):
             elif not os.path.exists(dest_path):
                 raise exceptions.TestFail("Cannot find the created copy")
 
+        # Follow the block job events before the job starts
+        tracker = blockjob_tracker.BlockJobTracker(vm_name, target)
+        tracker.start()
+
         # Run the real testing command
         cmd_result = virsh.blockcopy(vm_name, target, dest_path,
                                      options, **extra_dict)
@@ -526,10 +520,12 @@ def run(test, params, env):
                 val += options.count('--bytes')
                 if val == 0:
                     try:
-                        finish_job(vm_name, target, timeout)
+                        finish_job(vm_name, target, timeout, tracker)
                     except JobTimeout as excpt:
                         raise exceptions.TestFail("Run command failed: %s" %
                                                   excpt)
+                    logging.debug("Block copy throughput: %.1f MB/s",
+                                  tracker.throughput() / 10 ** 6)
                 if options.count("--raw") and not with_blockdev:
                     check_format(dest_path, dest_extension, dest_format)
                 if active_snap:
@@ -572,15 +568,15 @@ def run(test, params, env):
                 # in mirroring phase" could be in stdout which fail the
                 # check, so also do check in libvirtd log to confirm.
                 if options.count("--timeout") and options.count("--wait"):
-                    log_pattern = "Copy aborted"
-                    if (re.search(log_pattern, cmd_result.stdout.strip()) or
-                            chk_libvirtd_log(libvirtd_log_path,
-                                             log_pattern, "debug")):
+                    if (re.search(abort_pattern, cmd_result.stdout.strip()) or
+                            log_follower.search(abort_pattern, "debug")):
                         logging.debug("Found success a timed out block copy")
                 else:
                     raise exceptions.TestFail("Expect fail, but run "
                                               "successfully: %s" % bug_url)
     finally:
+        if tracker is not None:
+            tracker.stop()
         # Recover VM may fail unexpectedly, we need using try/except to
         # proceed the following cleanup steps
         try:
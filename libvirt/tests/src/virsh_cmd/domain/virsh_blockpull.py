@@ -1,4 +1,5 @@
 import os
+import time
 import logging
 import tempfile
 import collections
@@ -15,8 +16,17 @@ from virttest.utils_test import libvirt
 from virttest.libvirt_xml import vm_xml
 from virttest.libvirt_xml import snapshot_xml
 
+from provider import bench_helper
+from provider import blockjob_tracker
 from provider import libvirt_version
 
+# Files in guest of the block job benchmark, the probe appends the time in
+# microseconds of every probe write to LATENCY_FILE
+FILL_FILE = "/var/tmp/blockjob_fill"
+PROBE_FILE = "/var/tmp/blockjob_probe"
+LOAD_FILE = "/var/tmp/blockjob_load"
+LATENCY_FILE = "/tmp/blockjob_latency"
+
 
 def check_chain_xml(disk_xml, chain_lst):
     """
@@ -51,6 +61,112 @@ def check_chain_xml(disk_xml, chain_lst):
     return True
 
 
+def start_io_probe(session, interval=0.1):
+    """
+    Start timing a small synchronous write in guest every interval in
+    background, the write latency tells how much a block job slows down
+    the guest I/O.
+
+    :param session: Shell session of the guest
+    :param interval: Seconds between two probe writes
+    """
+    session.cmd("nohup sh -c 'while true; do start=$(date +%%s%%N); "
+                "dd if=/dev/zero of=%s bs=4k count=1 oflag=direct,dsync "
+                "2>/dev/null; echo $(( ($(date +%%s%%N) - start) / 1000 )) "
+                ">> %s; sleep %s; done' > /dev/null 2>&1 &"
+                % (PROBE_FILE, LATENCY_FILE, interval))
+
+
+def start_io_load(session, rate=5):
+    """
+    Start rewriting the first rate MiB of a file every second in guest in
+    background, so that the load dirties at most rate MiB/s and a mirror
+    job faster than that can still converge.
+
+    :param session: Shell session of the guest
+    :param rate: MiB written every second
+    """
+    session.cmd("nohup sh -c 'while true; do dd if=/dev/zero of=%s bs=1M "
+                "count=%s oflag=direct conv=notrunc 2>/dev/null; sleep 1; "
+                "done' > /dev/null 2>&1 &" % (LOAD_FILE, rate))
+
+
+def io_latencies(session):
+    """
+    Get the probe write latencies recorded since the last call.
+
+    :param session: Shell session of the guest
+    :return: List of latencies in seconds
+    """
+    latencies = []
+    for line in session.cmd_output("cat %s" % LATENCY_FILE).splitlines():
+        try:
+            latencies.append(int(line.strip()) / 10.0 ** 6)
+        except ValueError:
+            continue
+    session.cmd(": > %s" % LATENCY_FILE)
+    return latencies
+
+
+def latency_summary(latencies):
+    """
+    Summarize the probe write latencies.
+
+    :return: Dict like {'count': 10, 'p50': 0.001, 'p99': 0.01, 'max': 0.02}
+    """
+    return {'count': len(latencies),
+            'p50': bench_helper.percentile(latencies, 50),
+            'p99': bench_helper.percentile(latencies, 99),
+            'max': max(latencies or [0.0])}
+
+
+def moved_size(job, chain):
+    """
+    Get the bytes of data a block job moves, from the host allocation of
+    the images it reads, since the end of the job info covers the whole
+    virtual disk.
+
+    :param job: One of 'copy', 'commit' and 'pull'
+    :param chain: Image paths of the disk from the base to the top
+    :return: Bytes allocated in the images read by the job
+    """
+    if job == "copy":
+        images = chain
+    elif job == "commit":
+        images = chain[2:]
+    else:
+        images = chain[1:-1]
+    return sum(os.stat(image).st_blocks * 512 for image in images)
+
+
+def start_blockjob(vm_name, target, job, chain, bandwidth, copy_dest):
+    """
+    Start one block job on the backing chain without waiting for it.
+
+    The commit and pull jobs only move the snapshot layers, the original
+    image chain[0] is never written.
+
+    :param vm_name: Name of the domain
+    :param target: Target dev of the disk
+    :param job: One of 'copy', 'commit' and 'pull'
+    :param chain: Image paths of the disk from the base to the top
+    :param bandwidth: Bandwidth limit in MiB/s, 0 for no limit
+    :param copy_dest: Destination of the copy job
+    :return: CmdResult of the command
+    """
+    options = ""
+    if bandwidth:
+        options = " --bandwidth %s" % bandwidth
+    if job == "copy":
+        return virsh.blockcopy(vm_name, target, copy_dest,
+                               "--transient-job" + options, debug=True)
+    if job == "commit":
+        return virsh.blockcommit(vm_name, target, "--active --base %s%s"
+                                 % (chain[1], options), debug=True)
+    return virsh.blockpull(vm_name, target, "--base %s%s"
+                           % (chain[0], options), debug=True)
+
+
 def run(test, params, env):
     """
     Test command: virsh blockpull <domain> <path>
@@ -61,12 +177,16 @@ def run(test, params, env):
     4) Check result.
     """
 
-    def make_disk_snapshot(snapshot_take):
+    def make_disk_snapshot(snapshot_take, fill_size=0, vm_session=None):
         """
         Make external snapshots for disks only.
 
         :param snapshot_take: snapshots taken.
+        :param fill_size: MiB written in vm after each snapshot, so that
+                          every snapshot layer holds data.
+        :param vm_session: vm session to use instead of the test session.
         """
+        vm_session = vm_session or session
         for count in range(1, snapshot_take + 1):
             snap_xml = snapshot_xml.SnapshotXML()
             snapshot_name = "snapshot_test%s" % count
@@ -159,11 +279,19 @@ def run(test, params, env):
             file_path = flag_file.name
             flag_file.close()
 
-            status, output = session.cmd_status_output("touch %s" % file_path)
+            status, output = vm_session.cmd_status_output("touch %s"
+                                                          % file_path)
             if status:
                 test.fail("Touch file in vm failed. %s" % output)
             snapshot_flag_files.append(file_path)
 
+            if fill_size:
+                status, output = vm_session.cmd_status_output(
+                    "dd if=/dev/urandom of=%s bs=1M count=%s conv=fsync"
+                    % (FILL_FILE, fill_size), timeout=600)
+                if status:
+                    test.fail("Write data in vm failed. %s" % output)
+
     def get_first_disk_source():
         """
         Get disk source of first device
@@ -226,6 +354,136 @@ def run(test, params, env):
             else:
                 logging.debug("The actual qemu-img output:%s\n", ret)
 
+    def run_blockjob_bench():
+        """
+        Run every block job on a fresh backing chain with every bandwidth
+        limit and guest load, and report the job throughput and the guest
+        I/O latency with the job compared to without it.
+        """
+        jobs = params.get("blockjob_bench_jobs", "copy commit pull").split()
+        bandwidths = [int(bandwidth) for bandwidth in
+                      params.get("blockjob_bench_bandwidths", "0").split()]
+        loads = params.get("blockjob_bench_loads", "none dd").split()
+        depth = int(params.get("blockjob_bench_depth", 3))
+        layer_size = int(params.get("blockjob_bench_layer_size", 256))
+        load_rate = int(params.get("blockjob_bench_load_rate", 5))
+        baseline_time = float(params.get("blockjob_bench_baseline_time", 10))
+        probe_interval = float(params.get("blockjob_bench_probe_interval",
+                                          0.1))
+        results_file = params.get("blockjob_bench_results_file",
+                                  "blockjob_bench.json")
+        if depth < 2:
+            test.error("blockjob_bench_depth should be at least 2")
+        copy_dest = os.path.join(tmp_dir, "blockjob_bench.copy")
+        snap_prefix = "%s.snap" % blk_source.split('.')[0]
+
+        results = []
+        try:
+            for job in jobs:
+                for bandwidth in bandwidths:
+                    for load in loads:
+                        # Every run starts from the original image
+                        if vm.is_alive():
+                            vm.destroy(gracefully=False)
+                        vmxml_backup.sync("--snapshots-metadata")
+                        for disk in snapshot_external_disks + [copy_dest]:
+                            if os.path.exists(disk):
+                                os.remove(disk)
+                        del snapshot_external_disks[:]
+                        del snapshot_flag_files[:]
+                        vm.start()
+                        bench_session = vm.wait_for_login()
+                        bench_tracker = None
+                        try:
+                            make_disk_snapshot(depth, layer_size,
+                                               bench_session)
+                            chain = [blk_source] + [
+                                disk for disk in snapshot_external_disks
+                                if disk.startswith(snap_prefix)]
+                            start_io_probe(bench_session, probe_interval)
+                            if load == "dd":
+                                start_io_load(bench_session, load_rate)
+                            time.sleep(baseline_time)
+                            baseline = io_latencies(bench_session)
+
+                            bench_tracker = blockjob_tracker.BlockJobTracker(
+                                vm_name, blk_target)
+                            bench_tracker.start()
+                            moved = moved_size(job, chain)
+                            start = time.time()
+                            ret = start_blockjob(vm_name, blk_target, job,
+                                                 chain, bandwidth, copy_dest)
+                            libvirt.check_exit_status(ret)
+                            # The pull job is gone once completed
+                            converged = bench_tracker.wait(
+                                blockjob_timeout,
+                                job_required=job != "pull") is not None
+                            job_time = time.time() - start
+                            latencies = io_latencies(bench_session)
+                            # A mirror job slower than the guest load never
+                            # gets ready, which is a result as well
+                            finish = None
+                            if not converged:
+                                logging.warning("Block %s job with bandwidth "
+                                                "%s and %s load does not "
+                                                "finish in %ss", job,
+                                                bandwidth, load,
+                                                blockjob_timeout)
+                                finish = "--abort"
+                            elif job == "copy":
+                                finish = "--abort"
+                            elif job == "commit":
+                                finish = "--pivot"
+                            if finish:
+                                ret = virsh.blockjob(vm_name, blk_target,
+                                                     finish, **virsh_dargs)
+                                libvirt.check_exit_status(ret)
+                        finally:
+                            if bench_tracker:
+                                bench_tracker.stop()
+                            bench_session.close()
+                        # The original image is still the base of the chain
+                        check_chain_backing_files(blk_source, True)
+
+                        # Bandwidth caps are in MiB/s, so are the results
+                        summary = {'job': job,
+                                   'bandwidth': bandwidth,
+                                   'load': load,
+                                   'depth': depth,
+                                   'layer_size': layer_size,
+                                   'converged': converged,
+                                   'job_time': job_time,
+                                   'bytes': moved,
+                                   'mib_per_second': None,
+                                   'sampled_mib_per_second':
+                                       bench_tracker.throughput() / 2 ** 20,
+                                   'throughput_series':
+                                       bench_tracker.series(),
+                                   'baseline_latency':
+                                       latency_summary(baseline),
+                                   'job_latency': latency_summary(latencies),
+                                   'latency_p99_ratio': None}
+                        if converged:
+                            summary['mib_per_second'] = \
+                                moved / job_time / 2 ** 20
+                        if summary['baseline_latency']['p99']:
+                            summary['latency_p99_ratio'] = \
+                                summary['job_latency']['p99'] / \
+                                summary['baseline_latency']['p99']
+                        results.append(summary)
+                        logging.info("Block %s job with bandwidth %s and %s "
+                                     "load: %.1fs, %s MiB/s, guest write p99 "
+                                     "%.4fs without the job, %.4fs with it",
+                                     job, bandwidth or "unlimited", load,
+                                     job_time, summary['mib_per_second'],
+                                     summary['baseline_latency']['p99'],
+                                     summary['job_latency']['p99'])
+        finally:
+            if os.path.exists(copy_dest):
+                os.remove(copy_dest)
+            if results:
+                bench_helper.write_results(test, results_file, results)
+
     # MAIN TEST CODE ###
     # Process cartesian parameters
     vm_name = params.get("main_vm")
@@ -237,9 +495,11 @@ def run(test, params, env):
     snap_in_mirror_err = "yes" == params.get("snap_in_mirror_err", 'no')
     bandwidth = params.get("bandwidth", None)
     with_timeout = ("yes" == params.get("with_timeout_option", "no"))
+    blockjob_timeout = int(params.get("blockjob_timeout", 600))
     status_error = ("yes" == params.get("status_error", "no"))
     base_option = params.get("base_option", None)
     keep_relative = "yes" == params.get("keep_relative", 'no')
+    blockjob_bench = "yes" == params.get("blockjob_bench", "no")
     virsh_dargs = {'debug': True}
 
     # Check whether qemu-img need add -U suboption since locking feature was added afterwards qemu-2.10
@@ -268,6 +528,7 @@ def run(test, params, env):
     snapshot_external_disks = []
     # Prepare a blank params to confirm if delete the configure at the end of the test
     ceph_cfg = ""
+    tracker = None
     try:
         if disk_src_protocol == 'iscsi' and disk_type == 'network':
             if not libvirt_version.version_compare(1, 0, 4):
@@ -316,6 +577,10 @@ def run(test, params, env):
 
         # get a vm session before snapshot
         session = vm.wait_for_login()
+        if blockjob_bench:
+            session.close()
+            run_blockjob_bench()
+            return
         # do snapshot
         make_disk_snapshot(snapshot_take)
 
@@ -391,6 +656,10 @@ def run(test, params, env):
             # Check final backing chain files.
             check_chain_backing_files(blk_source_image, True)
             return
+        # Follow the block job events before the job starts
+        tracker = blockjob_tracker.BlockJobTracker(vm_name, blk_target)
+        tracker.start()
+
         # Run test case
         result = virsh.blockpull(vm_name, blk_target,
                                  blockpull_options, **virsh_dargs)
@@ -407,6 +676,13 @@ def run(test, params, env):
         # Check status_error
         libvirt.check_exit_status(result, status_error)
 
+        if not status and not with_timeout and not snap_in_mirror:
+            # The job should be reported completed as soon as it finishes
+            if tracker.wait(blockjob_timeout, ("completed",),
+                            job_required=False) is None:
+                test.fail("Block pull job is not completed in %ss"
+                          % blockjob_timeout)
+
         if not status and not with_timeout:
             if snap_in_mirror:
                 snap_mirror_path = "%s/snap_mirror" % tmp_dir
@@ -462,6 +738,8 @@ def run(test, params, env):
                 test.fail("blockpull failed: %s" % output)
 
     finally:
+        if tracker:
+            tracker.stop()
         # Remove ceph configure file if created
         if ceph_cfg:
             os.remove(ceph_cfg)
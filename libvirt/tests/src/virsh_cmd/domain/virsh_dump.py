@@ -1,8 +1,5 @@
 import os
 import logging
-import multiprocessing
-import time
-import platform
 
 from avocado.utils import process
 
@@ -10,10 +7,10 @@ from virttest import virsh
 from virttest import utils_libvirtd
 from virttest import utils_config
 from virttest import data_dir
-from virttest import utils_package
 from virttest.libvirt_xml import vm_xml
 
 
+from provider import fd_watcher
 from provider import libvirt_version
 
 
@@ -56,65 +53,23 @@ def run(test, params, env):
             test.cancel("API acl test not supported in current"
                         " libvirt version.")
 
-    def check_flag(file_flags):
+    def check_bypass(file_flags):
         """
-        Check if file flag include O_DIRECT.
+        Check the flags the domain core dump file was opened with.
 
-        :param file_flags: The flags of dumped file
-
-        Note, O_DIRECT(direct disk access hint) is defined as:
-        on x86_64:
-        #define O_DIRECT        00040000
-        on ppc64le or arch64:
-        #define O_DIRECT        00200000
-        """
-        arch = platform.machine()
-        file_flag_check = int('00040000', 16)
-        if 'ppc64' in arch or 'aarch64' in arch:
-            file_flag_check = int('00200000', 16)
-
-        if int(file_flags, 16) & file_flag_check == file_flag_check:
-            logging.info("File flags include O_DIRECT")
-            return True
-        else:
-            logging.error("File flags doesn't include O_DIRECT")
-            return False
-
-    def check_bypass(dump_file, result_dict):
-        """
-        Get the file flags of domain core dump file and check it.
+        :param file_flags: List of flags got by the FdFlagsWatcher
+        :return: Error message, empty if the flags include O_DIRECT
         """
         error = ''
-        cmd1 = "lsof -w %s" % dump_file
-        while True:
-            if not os.path.exists(dump_file) or process.system(cmd1):
-                time.sleep(0.1)
-                continue
-            cmd2 = ("cat /proc/$(%s |awk '/libvirt_i/{print $2}')/fdinfo/1"
-                    "|grep flags|awk '{print $NF}'" % cmd1)
-            ret = process.run(cmd2, allow_output_check='combined', shell=True)
-            status, output = ret.exit_status, ret.stdout_text.strip()
-            if status:
-                error = "Fail to get the flags of dumped file"
-                logging.error(error)
-                break
-            if not len(output):
-                continue
-            try:
-                logging.debug("The flag of dumped file: %s", output)
-                if check_flag(output):
-                    logging.info("Bypass file system cache "
-                                 "successfully when dumping")
-                    break
-                else:
-                    error = "Bypass file system cache fail when dumping"
-                    logging.error(error)
-                    break
-            except (ValueError, IndexError) as detail:
-                error = detail
-                logging.error(error)
-                break
-        result_dict['bypass'] = error
+        if not file_flags:
+            error = "Fail to get the flags of dumped file"
+            logging.error(error)
+        elif fd_watcher.has_flag(file_flags, os.O_DIRECT):
+            logging.info("Bypass file system cache successfully when dumping")
+        else:
+            error = "Bypass file system cache fail when dumping"
+            logging.error(error)
+        return error
 
     def check_domstate(actual, options):
         """
@@ -183,10 +138,6 @@ def run(test, params, env):
     qemu_config = utils_config.LibvirtQemuConfig()
     libvirtd = utils_libvirtd.Libvirtd()
 
-    # Install lsof pkg if not installed
-    if not utils_package.package_install("lsof"):
-        test.cancel("Failed to install lsof in host\n")
-
     if len(dump_image_format):
         qemu_config.dump_image_format = dump_image_format
         libvirtd.restart()
@@ -216,6 +167,7 @@ def run(test, params, env):
     dump_guest_core = params.get("dump_guest_core", "")
     if dump_guest_core not in ["", "on", "off"]:
         test.error("invalid dumpCore value: %s" % dump_guest_core)
+    flags_watcher = None
     try:
         # Set dumpCore in guest xml
         if dump_guest_core:
@@ -240,10 +192,8 @@ def run(test, params, env):
         # Deal with bypass-cache option
         if options.find('bypass-cache') >= 0:
             vm.wait_for_login()
-            result_dict = multiprocessing.Manager().dict()
-            child_process = multiprocessing.Process(target=check_bypass,
-                                                    args=(dump_file, result_dict))
-            child_process.start()
+            flags_watcher = fd_watcher.FdFlagsWatcher(dump_file)
+            flags_watcher.start(check_bypass_timeout)
 
         # Run virsh command
         cmd_result = virsh.dump(vm_name, dump_file, options,
@@ -251,9 +201,9 @@ def run(test, params, env):
                                 uri=uri,
                                 ignore_status=True, debug=True)
         status = cmd_result.exit_status
-        if 'child_process' in locals():
-            child_process.join(timeout=check_bypass_timeout)
-            params['bypass'] = result_dict['bypass']
+        if flags_watcher:
+            # The dump file can no longer be opened once the dump is done
+            params['bypass'] = check_bypass(flags_watcher.stop())
 
         logging.info("Start check result")
         if not check_domstate(vm.state(), options):
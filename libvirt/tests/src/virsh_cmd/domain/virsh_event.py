@@ -9,6 +9,8 @@ import shutil
 from aexpect import ShellTimeoutError
 from aexpect import ShellProcessTerminatedError
 
+from avocado.core import exceptions
+
 from virttest import virsh
 from virttest import data_dir
 from virttest.libvirt_xml import vm_xml
@@ -17,8 +19,124 @@ from virttest.libvirt_xml.devices.interface import Interface
 from virttest.libvirt_xml.devices.panic import Panic
 from virttest import utils_misc
 from provider import libvirt_version
+from provider import bench_helper
+from provider import event_watcher
+from provider import overlay_guest
+from provider import virsh_pool
 from xml.dom.minidom import parseString
 
+# Lifecycle event detail of the operations triggered by the benchmark
+BENCH_OPERATIONS = (("suspend", "Suspended"), ("resume", "Resumed"))
+
+
+def trigger_bench_events(pool, vm_name, iterations):
+    """
+    Suspend and resume a domain repeatedly to trigger lifecycle events.
+
+    :param pool: VirshSessionPool to run the commands
+    :param vm_name: Name of the running domain
+    :param iterations: Number of suspend and resume rounds
+    :return: List of (vm_name, detail, trigger_time) of every event
+    """
+    triggers = []
+    for _ in range(iterations):
+        for operation, detail in BENCH_OPERATIONS:
+            trigger_time = time.time()
+            result = pool.call(operation, vm_name)
+            if result.exit_status:
+                raise exceptions.TestFail("Failed to %s %s: %s"
+                                          % (operation, vm_name,
+                                             result.stderr))
+            triggers.append((vm_name, detail, trigger_time))
+    return triggers
+
+
+def run_event_bench(test, params, env):
+    """
+    Trigger lifecycle events at a high rate on many domains while several
+    event listeners are attached, and report the delivery latency and
+    the missing events of every listener.
+
+    The latency is the time from the start of the triggering command to
+    the event being received by the listener.
+    """
+    vm = env.get_vm(params.get("main_vm"))
+    domain_count = int(params.get("event_bench_domains", 10))
+    listener_count = int(params.get("event_bench_listeners", 1))
+    iterations = int(params.get("event_bench_iterations", 50))
+    concurrency = int(params.get("event_bench_concurrency", domain_count))
+    delivery_timeout = float(params.get("event_bench_delivery_timeout", 30))
+    results_file = params.get("event_bench_results_file", "event_bench.json")
+
+    if vm.is_alive():
+        vm.destroy()
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm.name)
+    guests = []
+    overlays = []
+    listeners = []
+    pool = None
+    try:
+        overlay_guest.create_overlay_guests(vmxml, domain_count,
+                                            data_dir.get_tmp_dir(),
+                                            guests, overlays)
+        for _ in range(listener_count):
+            listener = event_watcher.DomainEventWatcher(event="lifecycle")
+            listener.start()
+            listeners.append(listener)
+        pool = virsh_pool.VirshSessionPool(concurrency, uri="qemu:///system")
+
+        start = time.time()
+        triggers = bench_helper.run_in_parallel(
+            lambda vm_name: trigger_bench_events(pool, vm_name, iterations),
+            [(vm_name,) for vm_name in guests], concurrency)
+        trigger_elapsed = time.time() - start
+        triggers = [trigger for vm_triggers in triggers
+                    for trigger in vm_triggers]
+        deadline = time.time() + delivery_timeout
+
+        results = {'domains': domain_count,
+                   'listeners': [],
+                   'triggered': len(triggers),
+                   'trigger_elapsed': trigger_elapsed,
+                   'triggers_per_second': len(triggers) / trigger_elapsed}
+        for index, listener in enumerate(listeners):
+            recorder = bench_helper.LatencyRecorder()
+            missing = 0
+            last_event = start
+            for vm_name, detail, trigger_time in triggers:
+                event = listener.wait_for(
+                    vm_name, "lifecycle", detail, since=trigger_time,
+                    timeout=max(0, deadline - time.time()))
+                if event is None:
+                    missing += 1
+                    continue
+                recorder.record("delivery", event.time - trigger_time)
+                last_event = max(last_event, event.time)
+            delivered = len(triggers) - missing
+            result = recorder.results()
+            result.update({'listener': index,
+                           'delivered': delivered,
+                           'missing': missing,
+                           'received': listener.received,
+                           'events_per_second':
+                               delivered / max(last_event - start, 1e-6)})
+            results['listeners'].append(result)
+            logging.info("Listener %d: %d/%d events delivered, %.1f "
+                         "events/s", index, delivered, len(triggers),
+                         result['events_per_second'])
+            recorder.report()
+        bench_helper.write_results(test, results_file, results)
+        missing = [result['missing'] for result in results['listeners']]
+        if any(missing):
+            test.fail("Listeners missed %s of %d events"
+                      % (missing, len(triggers)))
+    finally:
+        for listener in listeners:
+            listener.stop()
+        if pool is not None:
+            pool.close()
+        overlay_guest.remove_overlay_guests(guests, overlays)
+
 
 def run(test, params, env):
     """
@@ -27,7 +145,12 @@ def run(test, params, env):
     1. Run virsh event/qemu-monitor-event in a new ShellSession
     2. Trigger various events
     3. Catch the return of virsh event and qemu-monitor-event, and check it.
+
+    With event_bench, measure the event delivery latency instead.
     """
+    if params.get("event_bench") == "yes":
+        run_event_bench(test, params, env)
+        return
 
     vms = []
     if params.get("multi_vms") == "yes":
@@ -4,9 +4,12 @@ import time
 import logging
 
 from avocado.utils import process
-from avocado.utils import software_manager
 
 from virttest import virsh
+from virttest import remote
+from virttest import virt_vm
+from virttest import data_dir
+from virttest import libvirt_vm
 from virttest import utils_libvirtd
 from virttest import utils_config
 from virttest import utils_misc
@@ -16,6 +19,212 @@ from virttest.utils_test import libvirt
 from virttest.staging.service import Factory
 from virttest.staging.utils_memory import drop_caches
 
+from provider import bench_helper
+from provider import fd_watcher
+from provider import overlay_guest
+
+MANAGED_SAVE_DIR = "/var/lib/libvirt/qemu/save"
+
+
+def save_guest_timed(name, mode, options, save_file):
+    """
+    Save one guest with virsh save or managedsave and collect the
+    statistics of the save.
+
+    :param name: Name of the guest
+    :param mode: 'save' or 'managedsave'
+    :param options: Options of the command
+    :param save_file: File the guest is saved to
+    :return: Dict like {'vm': 'vm1', 'status': 0, 'save_time': 10.0,
+             'bytes': 1073741824}
+    """
+    start = time.time()
+    if mode == "managedsave":
+        result = virsh.managedsave(name, options, ignore_status=True,
+                                   debug=True)
+    else:
+        result = virsh.save(name, save_file, options, ignore_status=True,
+                            debug=True)
+    stats = {'vm': name,
+             'status': result.exit_status,
+             'save_time': time.time() - start,
+             'bytes': None}
+    if result.exit_status:
+        logging.error("Failed to save %s: %s", name, result.stderr.strip())
+    elif os.path.exists(save_file):
+        stats['bytes'] = os.path.getsize(save_file)
+    return stats
+
+
+def restore_guest_timed(vm, mode, options, save_file, login_timeout):
+    """
+    Restore one guest saved by save_guest_timed and time until the guest
+    can be logged in.
+
+    :param vm: VM object of the guest
+    :param mode: 'save' or 'managedsave'
+    :param options: Options of the command
+    :param save_file: File the guest was saved to
+    :param login_timeout: Seconds to wait for the login
+    :return: Dict like {'vm': 'vm1', 'status': 0, 'restore_time': 5.0,
+             'login_time': 6.0}, login_time is None if the login failed
+    """
+    start = time.time()
+    if mode == "managedsave":
+        result = virsh.start(vm.name, options, ignore_status=True,
+                             debug=True)
+    else:
+        result = virsh.restore(save_file, options, ignore_status=True,
+                               debug=True)
+    stats = {'vm': vm.name,
+             'status': result.exit_status,
+             'restore_time': time.time() - start,
+             'login_time': None}
+    if result.exit_status:
+        logging.error("Failed to restore %s: %s", vm.name,
+                      result.stderr.strip())
+        return stats
+    try:
+        vm.wait_for_login(timeout=login_timeout).close()
+        stats['login_time'] = time.time() - start
+    except (remote.LoginError, virt_vm.VMError) as detail:
+        logging.error("Failed to login %s after restore: %s", vm.name,
+                      detail)
+    return stats
+
+
+def run_save_bench(test, params, env):
+    """
+    Save and restore N guests of varied memory sizes concurrently with
+    every option set, and report the time of each phase, the throughput
+    and the latency from restore to login.
+
+    :param test: Avocado test object
+    :param params: Dict of test parameters
+    :param env: Dict of the test environment
+    """
+    vm = env.get_vm(params.get("main_vm"))
+    guest_counts = [int(count) for count in
+                    params.get("save_bench_guest_counts", "1").split()]
+    memories = [int(memory) for memory in
+                params.get("save_bench_guest_memories", "1048576").split()]
+    modes = params.get("save_bench_modes", "save managedsave").split()
+    option_sets = params.get("save_bench_option_sets", "default").split()
+    fill_percent = int(params.get("save_bench_fill_percent", 40))
+    login_timeout = int(params.get("save_bench_login_timeout", 240))
+    save_dir = params.get("save_bench_dir", data_dir.get_tmp_dir())
+    results_file = params.get("save_bench_results_file", "save_bench.json")
+
+    if vm.is_alive():
+        vm.destroy()
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm.name)
+    tmp_dir = data_dir.get_tmp_dir()
+    guests = []
+    overlays = []
+    results = []
+    try:
+        # Guests cycle through the memory sizes, every guest dirties
+        # fill_percent of its memory so that the saved state is not empty
+        bench_vms = []
+        for index in range(max(guest_counts)):
+            name = "%s_save_%d" % (vm.name, index)
+            memory = memories[index % len(memories)]
+            overlays.append(overlay_guest.create_overlay_guest(
+                vmxml, name, tmp_dir, memory=memory, persistent=True))
+            guests.append(name)
+            bench_vm = libvirt_vm.VM(name, vm.params, vm.root_dir,
+                                     env.get("address_cache"))
+            session = bench_vm.wait_for_login(timeout=login_timeout)
+            fill_size = memory * fill_percent // 100 // 1024
+            session.cmd("dd if=/dev/urandom of=/dev/shm/save_bench_fill "
+                        "bs=1M count=%d" % fill_size, timeout=600)
+            session.close()
+            bench_vms.append((bench_vm, memory))
+
+        for count in sorted(guest_counts):
+            for mode in modes:
+                for option_set in option_sets:
+                    options = params.get("save_bench_options_%s"
+                                         % option_set, "")
+                    save_files = {}
+                    for bench_vm, _ in bench_vms[:count]:
+                        if mode == "managedsave":
+                            save_files[bench_vm.name] = os.path.join(
+                                MANAGED_SAVE_DIR, "%s.save" % bench_vm.name)
+                        else:
+                            save_files[bench_vm.name] = os.path.join(
+                                save_dir, "%s.save" % bench_vm.name)
+                    start = time.time()
+                    saves = bench_helper.run_in_parallel(
+                        save_guest_timed,
+                        [(bench_vm.name, mode, options,
+                          save_files[bench_vm.name])
+                         for bench_vm, _ in bench_vms[:count]], count)
+                    save_elapsed = time.time() - start
+                    failed = [stats['vm'] for stats in saves
+                              if stats['status']]
+                    if failed:
+                        test.fail("Failed to %s %s with '%s'"
+                                  % (mode, failed, options))
+
+                    # Read the saved states from disk, not from page cache
+                    drop_caches()
+                    start = time.time()
+                    try:
+                        restores = bench_helper.run_in_parallel(
+                            restore_guest_timed,
+                            [(bench_vm, mode, options,
+                              save_files[bench_vm.name], login_timeout)
+                             for bench_vm, _ in bench_vms[:count]], count)
+                    finally:
+                        for save_file in save_files.values():
+                            if os.path.exists(save_file):
+                                os.remove(save_file)
+                    restore_elapsed = time.time() - start
+                    failed = [stats['vm'] for stats in restores
+                              if stats['status'] or
+                              stats['login_time'] is None]
+                    if failed:
+                        test.fail("Failed to restore %s saved by %s with "
+                                  "'%s'" % (failed, mode, options))
+
+                    for stats, (_, memory) in zip(saves, bench_vms[:count]):
+                        stats['memory'] = memory
+                        stats.update([restore for restore in restores
+                                      if restore['vm'] == stats['vm']][0])
+                    total_bytes = sum(stats['bytes'] or 0 for stats in saves)
+                    login_times = [stats['login_time'] for stats in saves]
+                    summary = {'guests': count,
+                               'mode': mode,
+                               'option_set': option_set,
+                               'options': options,
+                               'vms': saves,
+                               'total_bytes': total_bytes,
+                               'save_elapsed': save_elapsed,
+                               'restore_elapsed': restore_elapsed,
+                               'save_gbytes_per_second':
+                                   total_bytes / save_elapsed / 10 ** 9,
+                               'restore_gbytes_per_second':
+                                   total_bytes / restore_elapsed / 10 ** 9,
+                               'login_time_p50':
+                                   bench_helper.percentile(login_times, 50),
+                               'login_time_max': max(login_times)}
+                    results.append(summary)
+                    logging.info("%s of %d guests with '%s': saved %.1f GB "
+                                 "in %.1fs (%.2f GB/s), restored in %.1fs "
+                                 "(%.2f GB/s), login after restore p50 "
+                                 "%.1fs max %.1fs", mode, count, options,
+                                 total_bytes / 10.0 ** 9, save_elapsed,
+                                 summary['save_gbytes_per_second'],
+                                 restore_elapsed,
+                                 summary['restore_gbytes_per_second'],
+                                 summary['login_time_p50'],
+                                 summary['login_time_max'])
+    finally:
+        if results:
+            bench_helper.write_results(test, results_file, results)
+        overlay_guest.remove_overlay_guests(guests, overlays)
+
 
 def run(test, params, env):
     """
@@ -26,9 +235,13 @@ def run(test, params, env):
     from the same state at a later time.
     """
 
+    if params.get("save_bench") == "yes":
+        run_save_bench(test, params, env)
+        return
+
     vm_name = params.get("main_vm")
     vm = env.get_vm(vm_name)
-    managed_save_file = "/var/lib/libvirt/qemu/save/%s.save" % vm_name
+    managed_save_file = os.path.join(MANAGED_SAVE_DIR, "%s.save" % vm_name)
 
     # define function
     def vm_recover_check(option, libvirtd, check_shutdown=False):
@@ -119,19 +332,19 @@ def run(test, params, env):
         xml_backup.define()
         vm.start()
 
-    def check_flags_parallel(virsh_cmd, bash_cmd, flags):
+    def check_flags_parallel(virsh_cmd, flags):
         """
-        Run the commands parallel and check the output.
+        Run the command and check the flags the managed save file is
+        opened with meanwhile.
         """
-        cmd = ("%s & %s" % (virsh_cmd, bash_cmd))
-        ret = process.run(cmd, ignore_status=True, shell=True,
+        watcher = fd_watcher.FdFlagsWatcher(managed_save_file)
+        watcher.start(check_flags_timeout)
+        ret = process.run(virsh_cmd, ignore_status=True, shell=True,
                           ignore_bg_processes=True)
-        output = ret.stdout_text.strip()
-        logging.debug("check flags output: %s" % output)
-        lines = re.findall(r"flags:.(\d+)", output, re.M)
-        logging.debug("Find all fdinfo flags: %s" % lines)
-        lines = [int(i, 8) & flags for i in lines]
-        if flags not in lines:
+        file_flags = watcher.join()
+        logging.debug("Find all fdinfo flags: %s",
+                      ["%o" % file_flag for file_flag in file_flags])
+        if not fd_watcher.has_flag(file_flags, flags):
             test.fail("Checking flags %s failed" % flags)
 
         return ret
@@ -192,7 +405,7 @@ def run(test, params, env):
         """
         utils_misc.wait_for(lambda: vm.state() == vm_state, 10)
 
-    def check_guest_flags(bash_cmd, flags):
+    def check_guest_flags(flags):
         """
         Check bypass_cache option for single guest.
         """
@@ -207,9 +420,7 @@ def run(test, params, env):
             virsh_cmd_stop = "service libvirt-guests stop"
             virsh_cmd_start = "service libvirt-guests start"
 
-        ret = check_flags_parallel(virsh_cmd_stop, bash_cmd %
-                                   (managed_save_file, managed_save_file,
-                                    "1"), flags)
+        ret = check_flags_parallel(virsh_cmd_stop, flags)
         if is_systemd:
             ret = libvirt_guests.raw_status()
         logging.info("status output: %s", ret.stdout_text)
@@ -225,9 +436,7 @@ def run(test, params, env):
 
         # Wait for VM in shut off state
         wait_for_state("shut off")
-        check_flags_parallel(virsh_cmd_start, bash_cmd %
-                             (managed_save_file, managed_save_file,
-                              "0"), flags)
+        check_flags_parallel(virsh_cmd_start, flags)
         # Wait for VM in running state
         wait_for_state("running")
 
@@ -323,6 +532,7 @@ def run(test, params, env):
     pre_vm_state = params.get("pre_vm_state", "")
     move_saved_file = "yes" == params.get("move_saved_file", "no")
     test_loop_cmd = "yes" == params.get("test_loop_cmd", "no")
+    check_flags_timeout = int(params.get("check_flags_timeout", 20))
     if option:
         if not virsh.has_command_help_match('managedsave', option):
             # Older libvirt does not have this option
@@ -410,30 +620,19 @@ def run(test, params, env):
             option += " --verbose"
         option += extra_param
 
-        # For bypass_cache test. Run a shell command to check fd flags while
-        # excuting managedsave command
-        software_mgr = software_manager.SoftwareManager()
-        if not software_mgr.check_installed('lsof'):
-            logging.info('Installing lsof package:')
-            software_mgr.install('lsof')
-        bash_cmd = ("let i=1; while((i++<400)); do if [ -e %s ]; then (cat /proc"
-                    "/$(lsof -w %s|awk '/libvirt_i/{print $2}')/fdinfo/*%s* |"
-                    "grep 'flags:.*') && break; else sleep 0.05; fi; done;")
+        # For bypass_cache test. Check the fd flags of the managed save file
+        # while executing managedsave command
         # Flags to check bypass cache take effect
         flags = os.O_DIRECT
         if test_bypass_cache:
             # Drop caches.
             drop_caches()
             virsh_cmd = "virsh managedsave %s %s" % (option, vm_name)
-            check_flags_parallel(virsh_cmd, bash_cmd %
-                                 (managed_save_file, managed_save_file,
-                                  "1"), flags)
+            check_flags_parallel(virsh_cmd, flags)
             # Wait for VM in shut off state
             wait_for_state("shut off")
             virsh_cmd = "virsh start %s %s" % (option, vm_name)
-            check_flags_parallel(virsh_cmd, bash_cmd %
-                                 (managed_save_file, managed_save_file,
-                                  "0"), flags)
+            check_flags_parallel(virsh_cmd, flags)
             # Wait for VM in running state
             wait_for_state("running")
         elif test_libvirt_guests:
@@ -443,7 +642,7 @@ def run(test, params, env):
                                    start_delay, libvirt_guests)
 
             if check_flags:
-                check_guest_flags(bash_cmd, flags)
+                check_guest_flags(flags)
 
         else:
             # Ensure VM is running
@@ -477,9 +676,7 @@ def run(test, params, env):
                 elif autostart_bypass_cache:
                     libvirtd.stop()
                     virsh_cmd = ("(service libvirtd start)")
-                    check_flags_parallel(virsh_cmd, bash_cmd %
-                                         (managed_save_file, managed_save_file,
-                                          "0"), flags)
+                    check_flags_parallel(virsh_cmd, flags)
                 elif test_loop_cmd:
                     loop_range = params.get("loop_range", "20")
                     vm_managedsave_loop(vm_name, loop_range, libvirtd)
@@ -8,6 +8,9 @@ from virttest import remote
 from virttest.libvirt_xml import vm_xml
 from virttest.staging import utils_memory
 
+from provider import bench_helper
+from provider import migration_bench
+
 
 def set_cpu_memory(vm_name, cpu, memory):
     """
@@ -103,7 +106,7 @@ def do_stress_migration(vms, srcuri, desturi, migration_type, test, params,
             migrate_setup.do_migration(vms, srcuri, desturi, migration_type,
                                        options=migrate_options,
                                        thread_timeout=thread_timeout)
-        except Exception, info:
+        except Exception as info:
             test.fail(info)
 
         uptime = post_migration_check(vms, uptime, test, params, uri=desturi)
@@ -117,7 +120,7 @@ def do_stress_migration(vms, srcuri, desturi, migration_type, test, params,
                 migrate_setup.do_migration(vms, desturi, srcuri, migration_type,
                                            options=migrate_options,
                                            thread_timeout=thread_timeout)
-            except Exception, info:
+            except Exception as info:
                 test.fail(info)
             finally:
                 for vm in vms:
@@ -126,6 +129,71 @@ def do_stress_migration(vms, srcuri, desturi, migration_type, test, params,
             migrate_setup.migrate_pre_setup(srcuri, params, cleanup=True)
 
 
+def do_migration_bench(vms, srcuri, desturi, test, params):
+    """
+    Migrate vms with each concurrency and report the throughput.
+
+    :param vms: migrated vms.
+    :param srcuri: connect uri for source machine
+    :param desturi: connect uri for destination machine
+    :param params: Test dict params
+
+    :raise: test.fail if migration fails
+    """
+    migrate_setup = utils_test.libvirt.MigrationTest()
+    # Pause the guests after virsh_migrate_timeout as do_stress_migration
+    # does, so that the stressed guests can finish the migration
+    options = ("%s --timeout %s"
+               % (params.get("migrate_options"),
+                  params.get("virsh_migrate_timeout", 60)))
+    concurrency_list = [int(concurrency) for concurrency in
+                        params.get("migration_bench_concurrency",
+                                   "1 2 4 8").split()]
+    # Seconds before a virsh migrate process is killed
+    kill_timeout = int(params.get("migration_bench_kill_timeout", 5400))
+    vm_names = [vm.name for vm in vms]
+    uptime = {}
+    for vm in vms:
+        uptime[vm.name] = vm.uptime()
+
+    results = []
+    for concurrency in concurrency_list:
+        logging.debug("Migrating vms from %s to %s with concurrency %s",
+                      srcuri, desturi, concurrency)
+        summary = migration_bench.migrate_vms(vm_names, desturi,
+                                              concurrency, options=options,
+                                              src_uri=srcuri,
+                                              timeout=kill_timeout)
+        results.append(summary)
+        if summary['failed']:
+            test.fail("Failed to migrate %s with concurrency %s"
+                      % (summary['failed'], concurrency))
+        uptime = post_migration_check(vms, uptime, test, params, uri=desturi)
+
+        # Migrate back so that every round starts from the source host
+        migrate_setup.migrate_pre_setup(srcuri, params)
+        try:
+            back = migration_bench.migrate_vms(vm_names, srcuri, concurrency,
+                                               options=options,
+                                               src_uri=desturi,
+                                               timeout=kill_timeout)
+        finally:
+            migrate_setup.migrate_pre_setup(srcuri, params, cleanup=True)
+        if back['failed']:
+            test.fail("Failed to migrate back %s" % back['failed'])
+        uptime = post_migration_check(vms, uptime, test, params)
+
+    for summary in results:
+        logging.info("concurrency=%-3d elapsed=%.1fs throughput=%.3fGB/s "
+                     "max_downtime=%sms max_wall_time=%.1fs",
+                     summary['concurrency'], summary['elapsed'],
+                     summary['gbytes_per_second'], summary['max_downtime'],
+                     summary['max_wall_time'])
+    bench_helper.write_results(test, params.get("migration_bench_results",
+                                                "migration_bench.json"),
+                               results)
+
+
 def run(test, params, env):
     """
     Test migration under stress.
@@ -155,6 +223,7 @@ def run(test, params, env):
     migration_type = params.get("migration_type")
     start_migration_vms = params.get("start_migration_vms", "yes") == "yes"
     thread_timeout = int(params.get("thread_timeout", 120))
+    run_bench = params.get("migration_bench", "no") == "yes"
     ubuntu_dep = ['build-essential', 'git']
     hstress = rstress = None
     vstress = {}
@@ -179,7 +248,7 @@ def run(test, params, env):
         try:
             hstress = utils_test.HostStress(stress_tool, params)
             hstress.load_stress_tool()
-        except utils_test.StressError, info:
+        except utils_test.StressError as info:
             test.error(info)
 
     if remote_stress:
@@ -199,7 +268,7 @@ def run(test, params, env):
             rstress = utils_test.HostStress(stress_tool, params, remote_server=True)
             rstress.load_stress_tool()
             remote_session.close()
-        except utils_test.StressError, info:
+        except utils_test.StressError as info:
             remote_session.close()
             test.error(info)
 
@@ -225,13 +294,16 @@ def run(test, params, env):
                     try:
                         vstress[vm.name] = utils_test.VMStress(vm, stress_tool, params)
                         vstress[vm.name].load_stress_tool()
-                    except utils_test.StressError, info:
+                    except utils_test.StressError as info:
                         session.close()
                         test.error(info)
                 session.close()
 
-        do_stress_migration(vms, src_uri, dest_uri, migration_type, test,
-                            params, thread_timeout)
+        if run_bench:
+            do_migration_bench(vms, src_uri, dest_uri, test, params)
+        else:
+            do_stress_migration(vms, src_uri, dest_uri, migration_type, test,
+                                params, thread_timeout)
     finally:
         logging.debug("Cleanup vms...")
         params["connect_uri"] = src_uri
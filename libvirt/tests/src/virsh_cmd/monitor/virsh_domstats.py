@@ -1,12 +1,19 @@
+import time
 import logging
 
 from aexpect import ShellTimeoutError
 from aexpect import ShellProcessTerminatedError
 
+from virttest import data_dir
 from virttest import virsh
 from virttest.libvirt_xml import vm_xml
 from virttest.libvirt_xml.devices.panic import Panic
 
+from provider import bench_helper
+from provider import domstats
+from provider import overlay_guest
+from provider import virsh_pool
+
 
 def prepare_vm_state(vm, vm_state):
     """
@@ -64,7 +71,8 @@ def prepare_vm_state(vm, vm_state):
 def check_output(output, vm, vm_state, options):
     """
     Check virsh domstats output according to vm state and command options;
-    For now, we only check given state domain can be find by list option.
+    check given state domain can be find by list option, then validate
+    the requested stat groups of the domain.
 
     :param output: Command result instance
     :param vm: Libvirt VM instance
@@ -124,11 +132,89 @@ def check_output(output, vm, vm_state, options):
         list_option_pass = vm.name in output
     if not list_option_pass:
         logging.error("Check '%s' option failed", list_option)
-    #TODO: check all output(state, cpu-total, ballon, vcpu, interface, block)
     check_pass.append(list_option_pass)
+
+    record = domstats.parse_domstats(output).get(vm.name)
+    if record is not None:
+        errors = domstats.validate(record, domstats.groups_of(options))
+        expected_state = domstats.DOMAIN_STATES.get(vm_state)
+        if ('state.state' in record and expected_state is not None and
+                record['state.state'] != expected_state):
+            errors.append("state.state is %s instead of %s"
+                          % (record['state.state'], expected_state))
+        for error in errors:
+            logging.error("Check stats of %s failed: %s", vm.name, error)
+        check_pass.append(not errors)
     return False not in check_pass
 
 
+def run_domstats_bench(test, params, env):
+    """
+    Measure the latency of virsh domstats for all domains as the number
+    of running domains and the enabled stat groups grow.
+    """
+    vm = env.get_vm(params.get("main_vm"))
+    domain_counts = [int(count) for count in
+                     params.get("bench_domain_counts", "1 10").split()]
+    group_sets = [group_set.strip() for group_set in
+                  params.get("bench_group_sets", "--state").split(',')]
+    iterations = int(params.get("bench_iterations", 20))
+    interval = float(params.get("bench_interval", 0))
+    results_file = params.get("bench_results_file", "domstats_bench.json")
+
+    if vm.is_alive():
+        vm.destroy()
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm.name)
+    tmp_dir = data_dir.get_tmp_dir()
+    # The monitoring agents keep one connection open while polling
+    pool = virsh_pool.VirshSessionPool(1, uri="qemu:///system")
+    guests = []
+    overlays = []
+    results = []
+    try:
+        for count in sorted(domain_counts):
+            overlay_guest.create_overlay_guests(vmxml, count, tmp_dir,
+                                                guests, overlays)
+            for group_set in group_sets:
+                recorder = bench_helper.LatencyRecorder()
+                domains = " ".join(guests)
+                for _ in range(iterations):
+                    result = recorder.timed("domstats", pool.call,
+                                            "domstats", domains, group_set)
+                    if result.exit_status:
+                        test.fail("domstats %s failed: %s"
+                                  % (group_set, result.stderr.strip()))
+                    time.sleep(interval)
+                parse_start = time.time()
+                records = domstats.parse_domstats(result.stdout)
+                parse_time = time.time() - parse_start
+                errors = dict((name, domstats.validate(
+                    record, domstats.groups_of(group_set)))
+                    for name, record in records.items())
+                errors = dict((name, error) for name, error in errors.items()
+                              if error)
+                if len(records) != count or errors:
+                    test.fail("domstats %s returned %d of %d domains, "
+                              "invalid stats: %s"
+                              % (group_set, len(records), count, errors))
+                stats = recorder.summary()["domstats"]
+                results.append({'domains': count,
+                                'groups': group_set,
+                                'latency': stats,
+                                'per_domain_mean': stats['mean'] / count,
+                                'parse_time': parse_time,
+                                'output_bytes': len(result.stdout)})
+                logging.info("%d domains, groups '%s': p50 %.3fs, p99 "
+                             "%.3fs, %d bytes", count, group_set,
+                             stats['p50'], stats['p99'],
+                             len(result.stdout))
+    finally:
+        pool.close()
+        if results:
+            bench_helper.write_results(test, results_file, results)
+        overlay_guest.remove_overlay_guests(guests, overlays)
+
+
 def run(test, params, env):
     """
     Test command: virsh domstats.
@@ -137,7 +223,13 @@ def run(test, params, env):
     2.Perform virsh domstats operation.
     3.Confirm the test result.
     4.Recover test environment.
+
+    With domstats_bench, measure the domstats latency instead.
     """
+    if params.get("domstats_bench") == "yes":
+        run_domstats_bench(test, params, env)
+        return
+
     default_vm_name = params.get("main_vm", "avocado-vt-vm1")
     default_vm = env.get_vm(default_vm_name)
     vm_list = params.get("vm_list", "")
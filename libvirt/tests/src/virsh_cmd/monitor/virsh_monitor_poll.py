@@ -0,0 +1,156 @@
+import time
+import logging
+
+from virttest import data_dir
+from virttest.libvirt_xml import vm_xml
+
+from provider import bench_helper
+from provider import domstats
+from provider import overlay_guest
+from provider import virsh_pool
+
+
+def poll_individual(pool, devices, recorder):
+    """
+    Poll every domain with dominfo, domblkstat, domifstat and dommemstat.
+
+    :param pool: VirshSessionPool to run the commands
+    :param devices: Dict like {vm_name: (disks, interfaces)}
+    :param recorder: LatencyRecorder of the commands
+    :return: Number of failed commands
+    """
+    failed = 0
+    for vm_name, (disks, interfaces) in devices.items():
+        calls = [("dominfo", (vm_name,)), ("dommemstat", (vm_name,))]
+        calls += [("domblkstat", (vm_name, disk, "")) for disk in disks]
+        calls += [("domifstat", (vm_name, iface)) for iface in interfaces]
+        for func_name, args in calls:
+            result = recorder.timed(func_name, pool.call, func_name, *args)
+            failed += bool(result.exit_status)
+    return failed
+
+
+def poll_bulk(pool, devices, recorder, groups):
+    """
+    Poll all the domains with one domstats command.
+
+    :param pool: VirshSessionPool to run the command
+    :param devices: Dict like {vm_name: (disks, interfaces)}
+    :param recorder: LatencyRecorder of the command
+    :param groups: Stat group options of domstats
+    :return: Number of failed commands
+    """
+    result = recorder.timed("domstats", pool.call, "domstats",
+                            " ".join(devices), groups)
+    return int(bool(result.exit_status))
+
+
+def get_devices(pool, vm_names):
+    """
+    Get the disks and interfaces of domains from their block and
+    interface stats.
+
+    :return: Dict like {vm_name: (['vda'], ['vnet0'])}
+    """
+    result = pool.call("domstats", " ".join(vm_names), "--block --interface")
+    devices = {}
+    for vm_name, record in domstats.parse_domstats(result.stdout).items():
+        devices[vm_name] = (
+            [record["block.%d.name" % index]
+             for index in range(record.get("block.count", 0))],
+            [record["net.%d.name" % index]
+             for index in range(record.get("net.count", 0))])
+    return devices
+
+
+def run(test, params, env):
+    """
+    Emulate a monitoring agent polling the stats of N domains at a given
+    interval, with per-domain commands or one bulk domstats, and compare
+    the call latency and the libvirtd CPU usage of the strategies.
+
+    1) Start N transient guests on overlays of main_vm.
+    2) For each strategy, poll all the guests every poll_interval
+       seconds for poll_duration seconds.
+    3) Report the latency, missed intervals and libvirtd CPU usage.
+    """
+    vm = env.get_vm(params.get("main_vm"))
+    domain_counts = [int(count) for count in
+                     params.get("poll_domain_counts", "10").split()]
+    strategies = params.get("poll_strategies", "individual bulk").split()
+    interval = float(params.get("poll_interval", 5))
+    duration = float(params.get("poll_duration", 60))
+    groups = params.get("poll_domstats_groups",
+                        "--state --cpu-total --balloon --interface --block")
+    results_file = params.get("poll_results_file", "monitor_poll.json")
+
+    pid = bench_helper.daemon_pid()
+    if pid is None:
+        test.error("libvirtd is not running")
+    if vm.is_alive():
+        vm.destroy()
+    vmxml = vm_xml.VMXML.new_from_inactive_dumpxml(vm.name)
+    tmp_dir = data_dir.get_tmp_dir()
+    # The monitoring agents keep one connection open while polling
+    pool = virsh_pool.VirshSessionPool(1, uri="qemu:///system")
+    guests = []
+    overlays = []
+    results = []
+    try:
+        for count in sorted(domain_counts):
+            overlay_guest.create_overlay_guests(vmxml, count, tmp_dir,
+                                                guests, overlays)
+            devices = get_devices(pool, guests)
+            for strategy in strategies:
+                recorder = bench_helper.LatencyRecorder()
+                # Cycles are recorded apart from the polled commands so
+                # that they do not count in the command throughput
+                cycles_recorder = bench_helper.LatencyRecorder()
+                failed = 0
+                cycles = 0
+                missed = 0
+                cpu_time = bench_helper.process_cpu_time(pid)
+                start = time.time()
+                while time.time() - start < duration:
+                    cycle_start = time.time()
+                    if strategy == "bulk":
+                        failed += poll_bulk(pool, devices, recorder, groups)
+                    else:
+                        failed += poll_individual(pool, devices, recorder)
+                    cycle_time = time.time() - cycle_start
+                    cycles_recorder.record("cycle", cycle_time)
+                    cycles += 1
+                    if cycle_time > interval:
+                        missed += 1
+                    else:
+                        time.sleep(interval - cycle_time)
+                elapsed = time.time() - start
+                cpu_time = bench_helper.process_cpu_time(pid) - cpu_time
+                if failed:
+                    test.fail("%d commands failed with %s polling"
+                              % (failed, strategy))
+
+                result = recorder.results(elapsed)
+                result['operations'].update(cycles_recorder.summary(
+                    bench_helper.DEFAULT_BUCKETS))
+                result.update({'domains': count,
+                               'strategy': strategy,
+                               'cycles': cycles,
+                               'missed_intervals': missed,
+                               'libvirtd_cpu_time': cpu_time,
+                               'libvirtd_cpu_percent':
+                                   cpu_time / elapsed * 100})
+                results.append(result)
+                cycle = result['operations']['cycle']
+                logging.info("%d domains, %s polling: cycle p50 %.3fs p99 "
+                             "%.3fs, %d/%d intervals missed, libvirtd CPU "
+                             "%.1f%%", count, strategy, cycle['p50'],
+                             cycle['p99'], missed, cycles,
+                             result['libvirtd_cpu_percent'])
+                recorder.report(elapsed)
+                cycles_recorder.report()
+    finally:
+        pool.close()
+        if results:
+            bench_helper.write_results(test, results_file, results)
+        overlay_guest.remove_overlay_guests(guests, overlays)
@@ -1,4 +1,6 @@
+import io
 import os
+import time
 import logging
 import string
 import hashlib
@@ -9,49 +11,256 @@ from avocado.utils import process
 from virttest import virsh
 from virttest import data_dir
 from virttest import libvirt_xml
+from virttest import utils_misc
 from virttest.utils_test import libvirt as utlv
 
+from provider import bench_helper
 from provider import libvirt_version
 
 
-def digest(path, offset, length):
+# Size of the buffer reused to read data for digest
+DIGEST_BUFSIZE = 4 * 1024 * 1024
+
+
+def file_size(path):
     """
-    Read data from file with length bytes, begin at offset
-    and return md5 hexdigest
+    Get the size of a file or a block device
+
+    :param path: file absolute path
+    :return: size in bytes
+    """
+    with io.open(path, 'rb') as read_fd:
+        return read_fd.seek(0, os.SEEK_END)
+
+
+def digest_range(path, offset, length, bufsize=DIGEST_BUFSIZE):
+    """
+    Read data from file with length bytes into a reused buffer,
+    begin at offset and return the md5 object
 
     :param path: file absolute path to read
     :param offset: offset that begin to read
-    :param length: length will read
-    :return: md5 result in hex
+    :param length: length will read, 0 means read to the end
+    :param bufsize: size of the read buffer
+    :return: md5 object
     """
-    with open(path, 'rb') as read_fd:
+    hash_md = hashlib.md5()
+    buf = memoryview(bytearray(bufsize))
+    with io.open(path, 'rb', buffering=0) as read_fd:
         read_fd.seek(offset)
-        hash_md = hashlib.md5()
         done = 0
         while True:
-            want = 1024
+            want = bufsize
             if length and length - done < want:
                 want = length - done
-            outstr = read_fd.read(want)
-            got = len(outstr)
-            if got == 0:
+            if want <= 0:
+                break
+            got = read_fd.readinto(buf[:want])
+            if not got:
                 break
             done += got
-            hash_md.update(outstr)
+            hash_md.update(buf[:got])
+    return hash_md
+
 
+def digest(path, offset, length, chunks=1, bufsize=DIGEST_BUFSIZE):
+    """
+    Read data from file with length bytes, begin at offset
+    and return md5 hexdigest
+
+    With chunks larger than 1, the range is split into chunks which are
+    hashed in parallel, and the result is the md5 of the chunk digests.
+    So only digests got with the same chunks can be compared.
+
+    :param path: file absolute path to read
+    :param offset: offset that begin to read
+    :param length: length will read, 0 means read to the end
+    :param chunks: number of ranges hashed in parallel
+    :param bufsize: size of the read buffer
+    :return: md5 result in hex
+    """
+    if chunks <= 1:
+        return digest_range(path, offset, length, bufsize).hexdigest()
+    if not length:
+        length = max(file_size(path) - offset, 0)
+    if not length:
+        # Nothing to read, such as the range after the end of the file
+        return hashlib.md5().hexdigest()
+    chunk_length = -(-length // chunks)
+    ranges = [(path, offset + start, min(chunk_length, length - start),
+               bufsize) for start in range(0, length, chunk_length)]
+    hash_md = hashlib.md5()
+    for chunk_md in bench_helper.run_in_parallel(digest_range, ranges,
+                                                 chunks):
+        hash_md.update(chunk_md.digest())
     return hash_md.hexdigest()
 
 
-def write_file(path):
+def write_file(path, size=1048576):
+    """
+    write size bytes of test data to file, 1M by default
+    """
+    logging.info("write %s bytes data into file %s", size, path)
+    datastr = ''.join(string.ascii_lowercase + string.ascii_uppercase +
+                      string.digits + '.' + '\n')
+    # 4M of test data
+    block = ''.join(65536 * datastr).encode(locale.getpreferredencoding())
+    with io.open(path, 'wb') as write_fd:
+        done = 0
+        while done < size:
+            data = block[:size - done]
+            write_fd.write(data)
+            done += len(data)
+
+
+def write_sparse_file(path, size, extent_size, extent_count):
+    """
+    Create a sparse file of size bytes with extent_count extents of test
+    data spread evenly, the rest of the file is holes
+
+    :param path: file absolute path
+    :param size: size of the file
+    :param extent_size: size of each data extent
+    :param extent_count: number of data extents
+    :return: list of (offset, length) of the data extents
+    """
+    logging.info("write %s extents of %s bytes into sparse file %s",
+                 extent_count, extent_size, path)
+    stride = size // extent_count
+    extents = [(index * stride, min(extent_size, stride))
+               for index in range(extent_count)]
+    block = os.urandom(extent_size)
+    with io.open(path, 'wb') as write_fd:
+        write_fd.truncate(size)
+        for extent_offset, extent_length in extents:
+            write_fd.seek(extent_offset)
+            write_fd.write(block[:extent_length])
+    return extents
+
+
+def digest_extents(path, extents, chunks=1):
+    """
+    Get the digest of each extent of a file
+
+    :param path: file absolute path
+    :param extents: list of (offset, length)
+    :param chunks: number of ranges hashed in parallel
+    :return: list of md5 results in hex
+    """
+    return [digest(path, extent_offset, extent_length, chunks)
+            for extent_offset, extent_length in extents]
+
+
+def timed_transfer(func, *args, **dargs):
+    """
+    Run vol-upload or vol-download and measure the cost
+
+    :param func: virsh.vol_upload or virsh.vol_download
+    :return: (wall time, busy CPU seconds of the host)
+    """
+    cpu_time = bench_helper.host_cpu_time()
+    start = time.time()
+    result = func(*args, **dargs)
+    wall_time = time.time() - start
+    utlv.check_exit_status(result)
+    return wall_time, bench_helper.host_cpu_time() - cpu_time
+
+
+def run_throughput_sweep(test, params, pvt, pool_name, vol_name, file_path,
+                         digest_chunks):
     """
-    write 1M test data to file
+    Upload and download dense and sparse volumes of each size, with and
+    without --sparse, and report the throughput and CPU time
+
+    :param test: test object
+    :param params: test params
+    :param pvt: PoolVolumeTest object with the pool prepared
+    :param pool_name: name of the pool
+    :param vol_name: name of the volume
+    :param file_path: local file to upload from and download to
+    :param digest_chunks: number of ranges hashed in parallel
     """
-    logging.info("write data into file %s", path)
-    with open(path, 'wb') as write_fd:
-        datastr = ''.join(string.ascii_lowercase + string.ascii_uppercase +
-                          string.digits + '.' + '\n')
-        data = ''.join(16384 * datastr)
-        write_fd.write(data.encode(locale.getpreferredencoding()))
+    sizes = params.get("vol_download_upload_bench_sizes", "1M").split()
+    frmt = params.get("vol_download_upload_bench_format", "raw")
+    layouts = params.get("vol_download_upload_bench_layouts",
+                         "dense").split()
+    sparse_opts = params.get("vol_download_upload_bench_sparse_opts",
+                             "no").split()
+    extent_size = int(float(utils_misc.normalize_data_size(
+        params.get("vol_download_upload_bench_extent_size", "1M"), "B")))
+    extent_count = int(params.get("vol_download_upload_bench_extent_count",
+                                  16))
+    if "yes" in sparse_opts and not libvirt_version.version_compare(3, 4, 0):
+        test.cancel("--sparse is not supported in current libvirt version")
+    download_path = file_path + ".download"
+    results = []
+    for size in sizes:
+        size_bytes = int(float(utils_misc.normalize_data_size(size, "B")))
+        for layout in layouts:
+            for sparse_opt in sparse_opts:
+                options = "--pool %s" % pool_name
+                if sparse_opt == "yes":
+                    options += " --sparse"
+                allocation = size_bytes if layout == "dense" else 0
+                pvt.pre_vol(vol_name, frmt, size_bytes, allocation, pool_name)
+                try:
+                    vol_path = virsh.vol_path(
+                        vol_name, pool_name,
+                        ignore_status=False).stdout.strip()
+                    if layout == "dense":
+                        write_file(file_path, size_bytes)
+                        extents = [(0, size_bytes)]
+                    else:
+                        extents = write_sparse_file(file_path, size_bytes,
+                                                    extent_size,
+                                                    extent_count)
+                    ori_digests = digest_extents(file_path, extents,
+                                                 digest_chunks)
+
+                    upload_time, upload_cpu = timed_transfer(
+                        virsh.vol_upload, vol_name, file_path, options,
+                        debug=True)
+                    if digest_extents(vol_path, extents,
+                                      digest_chunks) != ori_digests:
+                        test.fail("file digests do not match after "
+                                  "uploading %s %s volume" % (size, layout))
+
+                    download_time, download_cpu = timed_transfer(
+                        virsh.vol_download, vol_name, download_path,
+                        options, debug=True)
+                    if digest_extents(download_path, extents,
+                                      digest_chunks) != ori_digests:
+                        test.fail("file digests do not match after "
+                                  "downloading %s %s volume"
+                                  % (size, layout))
+                    allocated = os.stat(download_path).st_blocks * 512
+                finally:
+                    virsh.vol_delete(vol_name, pool_name, debug=True)
+                    for path in [file_path, download_path]:
+                        if os.path.isfile(path):
+                            os.remove(path)
+                results.append({'size': size_bytes,
+                                'layout': layout,
+                                'sparse': sparse_opt == "yes",
+                                'data_bytes': sum(length for _, length
+                                                  in extents),
+                                'upload_time': upload_time,
+                                'upload_cpu_time': upload_cpu,
+                                'upload_MBps': (size_bytes / upload_time /
+                                                10 ** 6),
+                                'download_time': download_time,
+                                'download_cpu_time': download_cpu,
+                                'download_MBps': (size_bytes /
+                                                  download_time / 10 ** 6),
+                                'download_allocation': allocated})
+                logging.info("%s %s sparse=%s: vol-upload %.1f MB/s "
+                             "(cpu %.2fs), vol-download %.1f MB/s "
+                             "(cpu %.2fs)", size, layout, sparse_opt,
+                             results[-1]['upload_MBps'], upload_cpu,
+                             results[-1]['download_MBps'], download_cpu)
+    bench_helper.write_results(test, params.get(
+        "vol_download_upload_bench_results", "vol_download_upload.json"),
+        results)
 
 
 def create_luks_vol(pool_name, vol_name, sec_uuid, vol_arg):
@@ -106,6 +315,8 @@ def run(test, params, env):
     b_luks_encrypt = "luks" == params.get("encryption_method")
     encryption_password = params.get("encryption_password", "redhat")
     secret_uuids = []
+    digest_chunks = int(params.get("vol_download_upload_digest_chunks", 1))
+    bench_sizes = params.get("vol_download_upload_bench_sizes")
 
     # libvirt acl polkit related params
     uri = params.get("virsh_uri")
@@ -122,6 +333,10 @@ def run(test, params, env):
         pvt = utlv.PoolVolumeTest(test, params)
         pvt.pre_pool(pool_name, pool_type, pool_target, "volumetest",
                      pre_disk_vol=["50M"])
+        if bench_sizes:
+            run_throughput_sweep(test, params, pvt, pool_name, vol_name,
+                                 file_path, digest_chunks)
+            return
         # According to BZ#1138523, we need inpect the right name
         # (disk partition) for new volume
         if pool_type == "disk":
@@ -194,13 +409,13 @@ def run(test, params, env):
                 """
                 # Get digest of pre region before offset
                 if offset != 0:
-                    digest_pre = digest(vol_path, 0, offset)
+                    digest_pre = digest(vol_path, 0, offset, digest_chunks)
                 else:
                     digest_pre = 0
                 logging.debug("pre region digest read from %s 0-%s is %s",
                               vol_path, offset, digest_pre)
                 # Get digest of post region after offset+length
-                digest_post = digest(vol_path, offset + length, 0)
+                digest_post = digest(vol_path, offset + length, 0, digest_chunks)
                 logging.debug("post region digest read from %s %s-0 is %s",
                               vol_path, offset + length, digest_post)
 
@@ -208,7 +423,7 @@ def run(test, params, env):
 
             # Get pre and post digest before operation for compare
             (ori_pre_digest, ori_post_digest) = get_pre_post_digest()
-            ori_digest = digest(file_path, 0, 0)
+            ori_digest = digest(file_path, 0, 0, digest_chunks)
             logging.debug("ori digest read from %s is %s", file_path,
                           ori_digest)
 
@@ -223,7 +438,7 @@ def run(test, params, env):
             if result.exit_status == 0:
                 # Get digest after operation
                 (aft_pre_digest, aft_post_digest) = get_pre_post_digest()
-                aft_digest = digest(vol_path, offset, length)
+                aft_digest = digest(vol_path, offset, length, digest_chunks)
                 logging.debug("aft digest read from %s is %s", vol_path,
                               aft_digest)
 
@@ -240,7 +455,7 @@ def run(test, params, env):
             write_file(vol_path)
 
             # Record the digest value before operation
-            ori_digest = digest(vol_path, offset, length)
+            ori_digest = digest(vol_path, offset, length, digest_chunks)
             logging.debug("original digest read from %s is %s", vol_path,
                           ori_digest)
 
@@ -255,7 +470,7 @@ def run(test, params, env):
                                         uri=uri, debug=True)
             if result.exit_status == 0:
                 # Get digest after operation
-                aft_digest = digest(file_path, 0, 0)
+                aft_digest = digest(file_path, 0, 0, digest_chunks)
                 logging.debug("new digest read from %s is %s", file_path,
                               aft_digest)
 
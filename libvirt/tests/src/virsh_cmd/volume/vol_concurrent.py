@@ -2,6 +2,7 @@ import logging
 import os
 import threading
 import re
+import time
 try:
     import queue as Queue
 except ImportError:
@@ -14,6 +15,8 @@ from virttest import data_dir
 from virttest import libvirt_storage
 from virttest.utils_test import libvirt as utlv
 
+from provider import bench_helper
+
 
 q = Queue.Queue()
 
@@ -73,6 +76,80 @@ def check_cmd_output(cmd_result, expect_error, test):
     logging.debug("Cmd output as expected:\n%s" % cmd_output)
 
 
+def scaling_worker(index, pool_name, vol_size, vol_format, iterations,
+                   recorder):
+    """
+    Create, clone, wipe and delete volumes in a loop and record the
+    latency of each operation
+
+    :param index: The index of the worker, used in the volume names
+    :param pool_name: The pool to operate volumes in
+    :param vol_size: The volume size
+    :param vol_format: The volume format
+    :param iterations: How many loops to run
+    :param recorder: The LatencyRecorder shared by all workers
+    :raise: exceptions.TestFail if any operation fails
+    """
+    for iteration in range(iterations):
+        vol_name = "scale_w%s_vol%s" % (index, iteration)
+        clone_name = "%s_clone" % vol_name
+        vol_file = prepare_vol_xml(vol_name, vol_size, vol_format)
+        operations = [("vol-create", virsh.vol_create,
+                       (pool_name, vol_file)),
+                      ("vol-clone", virsh.vol_clone,
+                       (vol_name, clone_name, pool_name)),
+                      ("vol-wipe", virsh.vol_wipe,
+                       (clone_name, pool_name)),
+                      ("vol-delete", virsh.vol_delete,
+                       (clone_name, pool_name)),
+                      ("vol-delete", virsh.vol_delete,
+                       (vol_name, pool_name))]
+        try:
+            for operation, func, args in operations:
+                result = recorder.timed(operation, func, *args)
+                if result.exit_status:
+                    raise exceptions.TestFail("%s failed:\n%s"
+                                              % (operation, result.stderr))
+        finally:
+            os.remove(vol_file)
+
+
+def run_scaling(test, params, pool_name, vol_size, vol_format):
+    """
+    Run scaling_worker with each number of concurrent workers against one
+    pool and report the throughput and latency of volume operations
+
+    :param test: The test object
+    :param params: The test params
+    :param pool_name: The pool to operate volumes in
+    :param vol_size: The volume size
+    :param vol_format: The volume format
+    """
+    workers_list = [int(workers) for workers in
+                    params.get("scaling_workers", "1 2 4 8").split()]
+    iterations = int(params.get("scaling_iterations", 10))
+    results = []
+    for workers in workers_list:
+        recorder = bench_helper.LatencyRecorder()
+        start = time.time()
+        try:
+            bench_helper.run_in_parallel(
+                scaling_worker,
+                [(index, pool_name, vol_size, vol_format, iterations,
+                  recorder) for index in range(workers)], workers)
+        except exceptions.TestFail as detail:
+            test.fail("%s workers: %s" % (workers, detail))
+        elapsed = time.time() - start
+        logging.info("%s concurrent workers:", workers)
+        recorder.report(elapsed)
+        summary = recorder.results(elapsed)
+        summary['workers'] = workers
+        results.append(summary)
+    bench_helper.write_results(test, params.get("scaling_results",
+                                                "vol_concurrent_scaling.json"),
+                               results)
+
+
 def run(test, params, env):
     """
     Test simultaneous volume operations
@@ -120,6 +197,10 @@ def run(test, params, env):
         logging.debug("Current pools:%s",
                       libvirt_storage.StoragePool().list_pools())
 
+        if params.get("scaling_workers"):
+            run_scaling(test, params, src_pool_name, vol_size, vol_format)
+            return
+
         # Create the src vol
         src_vol_name = params.get("volume_name")
         pv = libvirt_storage.PoolVolume(src_pool_name)
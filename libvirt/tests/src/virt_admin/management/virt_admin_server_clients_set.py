@@ -1,9 +1,179 @@
 import logging
+import resource
+import socket
+import time
+
 from virttest import virt_admin
 from virttest import virsh
 from virttest import utils_libvirtd
 from virttest import utils_config
 
+from provider import bench_helper
+from provider import virt_admin_sampler
+
+
+def open_connection(client_type, socket_path, timeout):
+    """
+    Open one client connection to libvirtd.
+
+    :param client_type: 'socket' to connect the unix socket directly,
+                        'virsh' to start a persistent virsh session
+    :param socket_path: Path of the libvirtd unix socket
+    :param timeout: Seconds to wait for the socket connection
+    :return: The socket or the VirshPersistent object
+    """
+    if client_type == "virsh":
+        return virsh.VirshPersistent(uri='qemu:///system')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def close_connection(conn):
+    """
+    Close a connection opened by open_connection.
+    """
+    if isinstance(conn, socket.socket):
+        conn.close()
+    else:
+        conn.close_session()
+
+
+def wait_for_nclients(clients_info, server_name, nclients, timeout=60):
+    """
+    Wait until the server has no more than nclients clients.
+
+    :return: The current number of clients
+    """
+    end_time = time.time() + timeout
+    while True:
+        current = clients_info(server_name)["nclients"]
+        if current <= nclients or time.time() > end_time:
+            return current
+        time.sleep(1)
+
+
+def connection_storm(test, params, clients_info):
+    """
+    Open connections to libvirtd at increasing rates and report the max
+    rate libvirtd sustains without failures.
+
+    :param test: test object
+    :param params: test params
+    :param clients_info: function to get the clients info as a dict
+    """
+    server_name = params.get("server_name")
+    client_type = params.get("storm_client_type", "socket")
+    socket_path = params.get("storm_socket", "/var/run/libvirt/libvirt-sock")
+    rates = [float(rate) for rate in params.get("storm_rates", "10").split()]
+    connections = int(params.get("storm_connections", 1000))
+    concurrency = int(params.get("storm_concurrency", 50))
+    connect_timeout = float(params.get("storm_connect_timeout", 10))
+    max_latency = float(params.get("storm_max_latency", 1))
+    interval = float(params.get("storm_sample_interval", 1))
+
+    # Every socket client needs a file descriptor in this process as well
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections * 2 + 1024
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        if hard != resource.RLIM_INFINITY:
+            wanted = min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    try:
+        pid = bench_helper.daemon_pid()
+        if pid is None:
+            test.error("libvirtd is not running")
+        baseline = clients_info(server_name)["nclients"]
+        results = []
+        for rate in rates:
+            recorder = bench_helper.LatencyRecorder()
+            failures = []
+            usage_before = bench_helper.process_usage(pid)
+            sampler = virt_admin_sampler.ServerInfoSampler(server_name,
+                                                           interval)
+            sampler.start()
+            start = time.time()
+
+            def _open(index):
+                delay = start + index / rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                connect_start = time.time()
+                try:
+                    conn = open_connection(client_type, socket_path,
+                                           connect_timeout)
+                except Exception as detail:
+                    failures.append(str(detail))
+                    return None
+                recorder.record("connect", time.time() - connect_start)
+                return conn
+
+            try:
+                conns = bench_helper.run_in_parallel(
+                    _open, [(index,) for index in range(connections)],
+                    concurrency)
+            finally:
+                sampler.stop()
+            elapsed = time.time() - start
+            conns = [conn for conn in conns if conn is not None]
+            try:
+                accepted = clients_info(server_name)["nclients"] - baseline
+                usage_after = bench_helper.process_usage(pid)
+            finally:
+                for conn in conns:
+                    close_connection(conn)
+            left = wait_for_nclients(clients_info, server_name, baseline)
+            if left > baseline:
+                logging.warning("%s clients are still connected after closing "
+                                "all connections", left - baseline)
+
+            result = recorder.results(elapsed)
+            result.update({'rate': rate,
+                           'connections': connections,
+                           'opened': len(conns),
+                           'failed': len(failures),
+                           'accepted': accepted,
+                           'achieved_rate': len(conns) / elapsed,
+                           'rss_growth': (usage_after['rss'] -
+                                          usage_before['rss']),
+                           'fds_growth': (usage_after['fds'] -
+                                          usage_before['fds']),
+                           'series': sampler.series()})
+            connect_stats = result['operations'].get("connect", {})
+            result['sustained'] = (not failures and accepted >= connections and
+                                   connect_stats.get('p99', 0) <= max_latency)
+            results.append(result)
+            logging.info("Rate %s/s: opened %d/%d, accepted %d, failed %d, "
+                         "p99 connect %.3fs, libvirtd rss +%d bytes, fds +%d",
+                         rate, len(conns), connections, accepted,
+                         len(failures),
+                         connect_stats.get('p99', 0), result['rss_growth'],
+                         result['fds_growth'])
+            if failures:
+                logging.debug("First connection failure: %s", failures[0])
+
+        sustained = [result['rate'] for result in results
+                     if result['sustained']]
+        summary = {'client_type': client_type,
+                   'nclients_max': params.get("nclients_maxi"),
+                   'nclients_unauth_max': params.get("nclients_unauth_maxi"),
+                   'max_sustained_rate': max(sustained) if sustained else None,
+                   'rates': results}
+        logging.info("Max sustained connection rate: %s/s",
+                     summary['max_sustained_rate'])
+        bench_helper.write_results(test, params.get("storm_results",
+                                                    "connection_storm.json"),
+                                   summary)
+    finally:
+        # Give the test runner its own limit back
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
 
 def run(test, params, env):
     """
@@ -13,6 +183,8 @@ def run(test, params, env):
     4) check whether the clients info is correct;
     5) try to connect other client onto the server;
     6) check whether the above connection status is correct.
+    With connection_storm, set the clients limits and open connections
+    at increasing rates to find the max rate libvirtd sustains.
     """
 
     server_name = params.get("server_name")
@@ -21,6 +193,7 @@ def run(test, params, env):
     nclients = params.get("nclients", "0")
     nclients_unauth_max = params.get("nclients_unauth_maxi", "")
     connect_able = params.get("connect_able", "yes")
+    storm = params.get("connection_storm") == "yes"
 
     config = utils_config.LibvirtdConfig()
     libvirtd = utils_libvirtd.Libvirtd()
@@ -28,20 +201,27 @@ def run(test, params, env):
 
     def clients_info(server):
         """
-        check the attributes by server-clients-set.
-        1) get the output  returned by server-clients-set;
-        2) split the output to get a dictionary of those attributes;
+        Get the clients info of server by srv-clients-info.
+
         :params server: print the info of the clients connecting to this server
-        :return: a dict obtained by transforming the result_info
+        :return: a dict of the attributes with int values
         """
         result_info = vp.srv_clients_info(server, ignore_status=True,
                                           debug=True)
-        out = result_info.stdout.strip().splitlines()
-        out_split = [item.split(':') for item in out]
-        out_dict = dict([[item[0].strip(), item[1].strip()] for item in out_split])
-        return out_dict
+        return virt_admin_sampler.parse_info(result_info.stdout)
 
     try:
+        if storm:
+            vp = virt_admin.VirtadminPersistent()
+            set_dargs = {'max_clients': nclients_max}
+            if nclients_unauth_max:
+                set_dargs['max_unauth_clients'] = nclients_unauth_max
+            result = vp.srv_clients_set(server_name, ignore_status=True,
+                                        debug=True, **set_dargs)
+            if result.exit_status:
+                test.fail("Failed to set the clients limits: %s" % result)
+            connection_storm(test, params, clients_info)
+            return
         if "max_clients" in options_ref:
             if int(nclients_max) > int(nclients):
                 vp = virt_admin.VirtadminPersistent()
@@ -67,7 +247,7 @@ def run(test, params, env):
             if result.exit_status:
                 test.fail("This operation should success "
                           "but failed! output:\n%s " % result)
-            elif outdict["nclients_max"] != str(nclients_max_set):
+            elif outdict["nclients_max"] != int(nclients_max_set):
                 test.fail("attributes set by server-clients-set "
                           "is not correct!")
 
@@ -1,6 +1,138 @@
 import logging
+import threading
+import time
+
 from virttest import virt_admin
 from virttest import utils_libvirtd
+from virttest.libvirt_xml import vm_xml
+
+from provider import bench_helper
+from provider import virsh_pool
+from provider import virt_admin_sampler
+
+
+def client_loop(pool, vm_name, stop_event, mutating_every, recorder,
+                failures):
+    """
+    Call libvirtd with mixed read-only and mutating virsh commands
+    until stop_event is set.
+
+    :param pool: VirshSessionPool to run the commands
+    :param vm_name: the domain to query and modify
+    :param stop_event: threading.Event to stop the loop
+    :param mutating_every: every Nth call is a mutating call,
+                           0 means read-only calls only
+    :param recorder: LatencyRecorder of the successful calls, shared by
+                     all clients
+    :param failures: LatencyRecorder of the failed calls, shared by all
+                     clients
+    """
+    def timed_call(func_name, *args):
+        start = time.time()
+        result = pool.call(func_name, *args)
+        if result.exit_status:
+            failures.record(func_name, time.time() - start)
+        else:
+            recorder.record(func_name, time.time() - start)
+
+    calls = 0
+    while not stop_event.is_set():
+        calls += 1
+        if mutating_every and calls % mutating_every == 0:
+            timed_call("desc", vm_name, "--config --title",
+                       "threadpool-bench-%s" % calls)
+        elif calls % 2:
+            timed_call("dominfo", vm_name)
+        else:
+            timed_call("domstats", vm_name)
+
+
+def run_threadpool_bench(test, params, vp):
+    """
+    Sweep max-workers and prio-workers while concurrent clients call
+    libvirtd, and report the throughput and job queue depth per setting.
+
+    :param test: test object
+    :param params: test params
+    :param vp: VirtadminPersistent session to set the threadpool
+    """
+    server_name = params.get("server_name")
+    vm_name = params.get("main_vm")
+    max_workers_list = params.get("bench_max_workers", "5 20").split()
+    prio_workers_list = params.get("bench_prio_workers", "5").split()
+    nclients = int(params.get("bench_clients", 16))
+    duration = float(params.get("bench_duration", 30))
+    interval = float(params.get("bench_sample_interval", 1))
+    mutating_every = int(params.get("bench_mutating_every", 4))
+
+    # The mutating calls change the title of the domain
+    vmxml_backup = vm_xml.VMXML.new_from_inactive_dumpxml(vm_name)
+    pool = virsh_pool.VirshSessionPool(nclients, uri="qemu:///system")
+    results = []
+    try:
+        for max_workers in max_workers_list:
+            for prio_workers in prio_workers_list:
+                result = vp.srv_threadpool_set(
+                    server_name, min_workers=min(2, int(max_workers)),
+                    max_workers=max_workers, prio_workers=prio_workers,
+                    ignore_status=True, debug=True)
+                if result.exit_status:
+                    test.fail("Failed to set the threadpool: %s" % result)
+                recorder = bench_helper.LatencyRecorder()
+                failures = bench_helper.LatencyRecorder()
+                stop_event = threading.Event()
+                clients = [threading.Thread(target=client_loop,
+                                            args=(pool, vm_name, stop_event,
+                                                  mutating_every, recorder,
+                                                  failures))
+                           for _ in range(nclients)]
+                sampler = virt_admin_sampler.ServerInfoSampler(server_name,
+                                                               interval)
+                sampler.start()
+                start = time.time()
+                try:
+                    for client in clients:
+                        client.start()
+                    time.sleep(duration)
+                finally:
+                    stop_event.set()
+                    for client in clients:
+                        client.join()
+                    sampler.stop()
+                elapsed = time.time() - start
+
+                series = sampler.series()
+                depths = [depth for depth in series['jobQueueDepth']
+                          if depth is not None] or [0]
+                summary = recorder.results(elapsed)
+                summary.update({'max_workers': int(max_workers),
+                                'prio_workers': int(prio_workers),
+                                'clients': nclients,
+                                'failed_count': failures.count(),
+                                'failures': failures.summary(),
+                                'series': series,
+                                'max_queue_depth': max(depths),
+                                'mean_queue_depth': (sum(depths) /
+                                                     float(len(depths))),
+                                'min_free_workers': min(
+                                    [free for free in series['freeWorkers']
+                                     if free is not None] or [0])})
+                results.append(summary)
+                logging.info("max_workers=%s prio_workers=%s: %.1f ops/sec, "
+                             "%d failed calls, queue depth max %s mean "
+                             "%.1f, min free workers %s", max_workers,
+                             prio_workers, summary['ops_per_second'],
+                             summary['failed_count'],
+                             summary['max_queue_depth'],
+                             summary['mean_queue_depth'],
+                             summary['min_free_workers'])
+                recorder.report()
+    finally:
+        pool.close()
+        vmxml_backup.sync()
+    bench_helper.write_results(test, params.get("bench_results",
+                                                "threadpool_bench.json"),
+                               results)
 
 
 def run(test, params, env):
@@ -11,6 +143,8 @@ def run(test, params, env):
        set the params of threadpool by virt-admin server-threadpool-set,
        check whether the result printed by server-threadpool-info
        are consistent with the above setting.
+    2) With threadpool_bench, sweep max-workers and prio-workers under
+       concurrent client load and report the throughput per setting.
     """
     server_name = params.get("server_name")
     options_ref = params.get("options_ref")
@@ -22,26 +156,26 @@ def run(test, params, env):
     min_workers_gt_nworkers = params.get("min_workers_gt_nworkers") == "yes"
     max_workers_gt_nworkers = params.get("max_workers_gt_nworkers") == "yes"
     options_test_together = params.get("options_test_together") == "yes"
+    threadpool_bench = params.get("threadpool_bench") == "yes"
 
     libvirtd = utils_libvirtd.Libvirtd()
     vp = virt_admin.VirtadminPersistent()
 
     def threadpool_info(server):
         """
-        check the attributes by server-threadpool-set.
-        1) get the output returned by server-threadpool-set;
-        2) split the output to get a dictionary of those attributes.
+        Get the threadpool info of server by server-threadpool-info.
+
         :param server: get the threadpool info of this server.
-        :return: a dict obtained by converting result_info.
+        :return: a dict of the attributes with int values.
         """
         result_info = vp.srv_threadpool_info(server, ignore_status=True,
                                              debug=True)
-        out = result_info.stdout.strip().splitlines()
-        out_split = [item.split(':') for item in out]
-        out_dict = dict([[item[0].strip(), item[1].strip()] for item in out_split])
-        return out_dict
+        return virt_admin_sampler.parse_info(result_info.stdout)
 
     try:
+        if threadpool_bench:
+            run_threadpool_bench(test, params, vp)
+            return
         if options_ref:
             if "min-workers" in options_ref:
                 result = vp.srv_threadpool_set(server_name, min_workers=min_workers,
@@ -76,27 +210,27 @@ def run(test, params, env):
                 outdict = threadpool_info(server_name)
                 if options_ref:
                     if "min-workers" in options_ref:
-                        if outdict["minWorkers"] != min_workers:
+                        if outdict["minWorkers"] != int(min_workers):
                             test.fail("minWorkers set by server-threadpool-set "
                                       "is not correct!")
                         if min_workers_gt_nworkers:
-                            if outdict["nWorkers"] != min_workers:
+                            if outdict["nWorkers"] != int(min_workers):
                                 test.fail("nworkers is not increased as min-workers increased.")
                     if "max-workers" in options_ref:
-                        if outdict["maxWorkers"] != max_workers:
+                        if outdict["maxWorkers"] != int(max_workers):
                             test.fail("maxWorkers set by server-threadpool-set "
                                       "is not correct!")
                         if not max_workers_gt_nworkers:
-                            if outdict["nWorkers"] != max_workers:
+                            if outdict["nWorkers"] != int(max_workers):
                                 test.fail("nworkers is not increased as max-workers decreased.")
                     if "priority_workers" in options_ref:
-                        if outdict["prioWorkers"] != priority_workers:
+                        if outdict["prioWorkers"] != int(priority_workers):
                             test.fail("priority workers set by server-threadpool-set "
                                       "is not correct!")
                 elif options_test_together:
-                    if (outdict["minWorkers"] != min_workers or
-                            outdict["maxWorkers"] != max_workers or
-                            outdict["prioWorkers"] != priority_workers):
+                    if (outdict["minWorkers"] != int(min_workers) or
+                            outdict["maxWorkers"] != int(max_workers) or
+                            outdict["prioWorkers"] != int(priority_workers)):
                         test.fail("The numbers of workers set together by server-threadpool-set "
                                   "are not correct!")
             else:
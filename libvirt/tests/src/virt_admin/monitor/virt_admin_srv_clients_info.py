@@ -4,6 +4,8 @@ from virttest import utils_libvirtd
 from virttest import utils_config
 from virttest import virsh
 
+from provider import virt_admin_sampler
+
 
 def run(test, params, env):
     """
@@ -34,19 +36,17 @@ def run(test, params, env):
             virsh_instant.append(virsh.VirshPersistent(uri="qemu:///system"))
 
         result = vp.srv_clients_info(server_name, ignore_status=True, debug=True)
-        output = result.stdout.strip().splitlines()
-        out_split = [item.split(':') for item in output]
-        out_dict = dict([[item[0].strip(), item[1].strip()] for item in out_split])
+        out_dict = virt_admin_sampler.parse_info(result.stdout)
 
         if result.exit_status:
             raise exceptions.TestFail("This operation should success "
                                       "but failed. Output:\n %s" % result)
         else:
-            if not (out_dict["nclients_max"] == max_clients and
-                    out_dict["nclients_unauth_max"] == max_anonymous_clients):
+            if not (out_dict["nclients_max"] == int(max_clients) and
+                    out_dict["nclients_unauth_max"] == int(max_anonymous_clients)):
                 raise exceptions.TestFail("attributes info listed by "
                                           "srv-clients-info is not correct.")
-            if not out_dict["nclients"] == num_clients:
+            if not out_dict["nclients"] == int(num_clients):
                 raise exceptions.TestFail("the number of clients connect to libvirtd "
                                           "is not correct.")
     finally:
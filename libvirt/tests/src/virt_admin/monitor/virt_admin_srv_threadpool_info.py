@@ -3,6 +3,8 @@ from virttest import virt_admin
 from virttest import utils_config
 from virttest import utils_libvirtd
 
+from provider import virt_admin_sampler
+
 
 def run(test, params, env):
     """
@@ -36,23 +38,21 @@ def run(test, params, env):
         vp = virt_admin.VirtadminPersistent()
         result = vp.srv_threadpool_info(server_name, ignore_status=True, debug=True)
 
-        output = result.stdout.strip().splitlines()
-        out_split = [item.split(':') for item in output]
-        out_dict = dict([[item[0].strip(), item[1].strip()] for item in out_split])
+        out_dict = virt_admin_sampler.parse_info(result.stdout)
 
         if result.exit_status:
             raise exceptions.TestFail("This operation should success "
                                       "but failed! Output: \n %s" % result)
         else:
             if server_name == "libvirtd":
-                if not (out_dict["minWorkers"] == min_workers and
-                        out_dict["maxWorkers"] == max_workers and
-                        out_dict["prioWorkers"] == prio_workers):
+                if not (out_dict["minWorkers"] == int(min_workers) and
+                        out_dict["maxWorkers"] == int(max_workers) and
+                        out_dict["prioWorkers"] == int(prio_workers)):
                     raise exceptions.TestFail("attributes info listed by "
                                               "srv-threadpool-info is not correct!")
             elif server_name == "admin":
-                if not (out_dict["minWorkers"] == admin_min_workers and
-                        out_dict["maxWorkers"] == admin_max_workers):
+                if not (out_dict["minWorkers"] == int(admin_min_workers) and
+                        out_dict["maxWorkers"] == int(admin_max_workers)):
                     raise exceptions.TestFail("attributes info listed by "
                                               "srv-threadpool-info is not correct!")
     finally:
@@ -0,0 +1,306 @@
+"""
+Shared code for tests that measure the performance of libvirt operations
+"""
+
+import os
+import json
+import math
+import logging
+import threading
+import time
+
+from six.moves import queue
+
+from avocado.utils import process
+
+# Upper bounds in seconds of the default latency histogram buckets
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def percentile(values, percent):
+    """
+    Get the percentile of values with the nearest-rank method.
+
+    :param values: List of numbers
+    :param percent: Percentile to get, from 0 to 100
+    :return: The value at the given percentile, 0.0 if values is empty
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+def histogram(values, buckets=DEFAULT_BUCKETS):
+    """
+    Count values into buckets.
+
+    :param values: List of numbers
+    :param buckets: Sorted upper bounds of the buckets, values greater than
+                    the last bound are counted into the "+inf" bucket
+    :return: List of (upper_bound, count) tuples
+    """
+    counts = [0] * (len(buckets) + 1)
+    for value in values:
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+    return list(zip([str(bound) for bound in buckets] + ["+inf"], counts))
+
+
+def parse_buckets(buckets_str):
+    """
+    Parse histogram buckets from a comma separated string.
+
+    :param buckets_str: String like "0.1,1,10", None or empty string
+                        means the default buckets
+    :return: Sorted list of upper bounds
+    """
+    if not buckets_str:
+        return list(DEFAULT_BUCKETS)
+    return sorted(float(bound) for bound in buckets_str.split(','))
+
+
+def write_results(test, file_name, results):
+    """
+    Write results as json into the output dir of test.
+
+    :param test: Avocado test object
+    :param file_name: Name of the results file
+    :param results: Json serializable results
+    :return: Path of the results file
+    """
+    results_file = os.path.join(test.outputdir, file_name)
+    with open(results_file, 'w') as results_fd:
+        json.dump(results, results_fd, indent=4, sort_keys=True)
+    logging.info("Results are written to %s", results_file)
+    return results_file
+
+
+def host_cpu_time():
+    """
+    Get the busy CPU time of the host from /proc/stat.
+
+    :return: Seconds all CPUs spent out of idle and iowait since boot
+    """
+    with open("/proc/stat") as stat_file:
+        fields = stat_file.readline().split()
+    # cpu user nice system idle iowait irq softirq steal ...
+    ticks = [int(field) for field in fields[1:9]]
+    busy = sum(ticks) - ticks[3] - ticks[4]
+    return busy / float(os.sysconf(os.sysconf_names['SC_CLK_TCK']))
+
+
+def daemon_pid(name="libvirtd"):
+    """
+    Get the pid of a daemon process.
+
+    :param name: Name of the daemon process
+    :return: The pid, None if the daemon is not running
+    """
+    pid = process.getoutput("pidof -s %s" % name).strip()
+    return int(pid) if pid.isdigit() else None
+
+
+def process_usage(pid):
+    """
+    Get the resident memory and the number of open files of a process.
+
+    :param pid: Pid of the process
+    :return: Dict like {'rss': 10485760, 'fds': 20}, rss is in bytes
+    """
+    rss = 0
+    with open("/proc/%s/status" % pid) as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                # VmRSS:     10240 kB
+                rss = int(line.split()[1]) * 1024
+                break
+    return {'rss': rss, 'fds': len(os.listdir("/proc/%s/fd" % pid))}
+
+
+def process_cpu_time(pid):
+    """
+    Get the CPU time a process has used from /proc/<pid>/stat.
+
+    :param pid: Pid of the process
+    :return: Seconds the process spent in user and system mode
+    """
+    with open("/proc/%s/stat" % pid) as stat_file:
+        # The command name may contain spaces, so split after it
+        fields = stat_file.read().rsplit(')', 1)[1].split()
+    # utime and stime are the 14th and 15th fields of the stat file
+    ticks = int(fields[11]) + int(fields[12])
+    return ticks / float(os.sysconf(os.sysconf_names['SC_CLK_TCK']))
+
+
+def run_in_parallel(func, args_list, concurrency):
+    """
+    Call func with each item of args_list in at most concurrency threads.
+
+    :param func: Function to call
+    :param args_list: List of argument tuples, one call for each tuple
+    :param concurrency: Max number of calls running at the same time
+    :return: List of the return values in the order of args_list
+    :raise: The first exception raised by func after all calls finish
+    """
+    jobs = queue.Queue()
+    for index, args in enumerate(args_list):
+        jobs.put((index, args))
+    results = [None] * len(args_list)
+    errors = []
+
+    def _worker():
+        while True:
+            try:
+                index, args = jobs.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = func(*args)
+            except Exception as detail:
+                logging.error("%s%s failed: %s", func.__name__, args, detail)
+                errors.append(detail)
+
+    threads = []
+    for _ in range(max(1, min(concurrency, len(args_list)))):
+        thread = threading.Thread(target=_worker)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class LatencyRecorder(object):
+
+    """
+    Thread-safe recorder of the latency of named operations
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, operation, seconds):
+        """
+        Record one latency sample of operation.
+
+        :param operation: Name of the operation
+        :param seconds: Latency of the operation in seconds
+        """
+        with self._lock:
+            self.samples.setdefault(operation, []).append(seconds)
+
+    def timed(self, operation, func, *args, **kwargs):
+        """
+        Call func with args and kwargs and record its latency.
+
+        :param operation: Name of the operation
+        :param func: Function to call
+        :return: The return value of func
+        """
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(operation, time.time() - start)
+
+    def count(self, operation=None, operations=None):
+        """
+        Get the number of recorded samples.
+
+        :param operation: Name of the operation, None means all operations
+        :param operations: Names of the operations to sum up, used when
+                           operation is None, None means all operations
+        :return: Number of samples
+        """
+        with self._lock:
+            if operation is not None:
+                return len(self.samples.get(operation, []))
+            return sum(len(values) for op, values in self.samples.items()
+                       if operations is None or op in operations)
+
+    def summary(self, buckets=None):
+        """
+        Get the latency statistics of every operation.
+
+        :param buckets: Upper bounds of histogram buckets, None means
+                        do not include the histogram
+        :return: Dict like {operation: {'count': 10, 'min': 0.1, ...}},
+                 latencies are in seconds
+        """
+        with self._lock:
+            samples = dict((op, list(values))
+                           for op, values in self.samples.items())
+        result = {}
+        for operation, values in samples.items():
+            result[operation] = {'count': len(values),
+                                 'min': min(values),
+                                 'max': max(values),
+                                 'mean': sum(values) / len(values),
+                                 'p50': percentile(values, 50),
+                                 'p95': percentile(values, 95),
+                                 'p99': percentile(values, 99)}
+            if buckets is not None:
+                result[operation]['histogram'] = histogram(values, buckets)
+        return result
+
+    def ops_per_second(self, elapsed, operations=None):
+        """
+        Get the throughput of the recorded operations.
+
+        :param elapsed: Wall time in seconds the operations took
+        :param operations: Names of the operations to count, None means
+                           all operations
+        :return: Operations per second
+        """
+        if elapsed <= 0:
+            return 0.0
+        return self.count(operations=operations) / float(elapsed)
+
+    def results(self, elapsed=None, buckets=DEFAULT_BUCKETS,
+                operations=None):
+        """
+        Get the statistics in a json serializable dict.
+
+        :param elapsed: Wall time in seconds the operations took
+        :param buckets: Upper bounds of histogram buckets
+        :param operations: Names of the operations counted in total_count
+                           and ops_per_second, None means all operations,
+                           the statistics of every operation are included
+                           anyway
+        :return: Dict with the statistics of every operation
+        """
+        results = {'operations': self.summary(buckets),
+                   'total_count': self.count(operations=operations)}
+        if elapsed is not None:
+            results['elapsed'] = elapsed
+            results['ops_per_second'] = self.ops_per_second(elapsed,
+                                                            operations)
+        return results
+
+    def report(self, elapsed=None, operations=None):
+        """
+        Log the latency statistics and the throughput.
+
+        :param elapsed: Wall time in seconds the operations took,
+                        None means do not report the throughput
+        :param operations: Names of the operations counted in the
+                           throughput, None means all operations
+        """
+        for operation, stats in sorted(self.summary().items()):
+            logging.info("%s: count=%d p50=%.3fs p95=%.3fs p99=%.3fs "
+                         "max=%.3fs", operation, stats['count'],
+                         stats['p50'], stats['p95'], stats['p99'],
+                         stats['max'])
+        if elapsed is not None:
+            logging.info("Total %d operations in %.1fs, %.2f ops/sec",
+                         self.count(operations=operations), elapsed,
+                         self.ops_per_second(elapsed, operations))
@@ -0,0 +1,159 @@
+"""
+Shared code for tests that need to wait for block jobs such as blockcopy,
+blockcommit and blockpull
+"""
+
+import re
+import time
+import logging
+
+from avocado.core import exceptions
+
+from virttest import virsh
+
+from provider import event_watcher
+
+RAW_INFO_REGEX = re.compile(r"(\w+)=(\d+)")
+
+
+def parse_raw_info(output):
+    """
+    Parse the output of 'virsh blockjob --info --raw'.
+
+    :param output: The command output, such as
+                   " type=Block Copy\\n bandwidth=0\\n cur=10\\n end=20"
+    :return: Dict like {'bandwidth': 0, 'cur': 10, 'end': 20}, empty if
+             there is no block job
+    """
+    return dict((key, int(value))
+                for key, value in RAW_INFO_REGEX.findall(output))
+
+
+class BlockJobTracker(object):
+
+    """
+    Wait for a block job of a disk through the block-job-2 events, with
+    polling of the job info as fallback, and record the job progress
+    """
+
+    def __init__(self, vm_name, target, poll_interval=0.5, **virsh_dargs):
+        """
+        :param vm_name: Name of the domain
+        :param target: Target dev of the disk such as 'vda'
+        :param poll_interval: Seconds between two polls of the job info
+        :param virsh_dargs: Standardized virsh function API keywords
+        """
+        self.vm_name = vm_name
+        self.target = target
+        self.poll_interval = poll_interval
+        self.virsh_dargs = virsh_dargs
+        self.samples = []
+        self._watcher = event_watcher.DomainEventWatcher(
+            event="block-job-2", uri=virsh_dargs.get('uri'))
+        self._virsh = None
+        self._start_time = None
+
+    def start(self):
+        """
+        Start following the events, call it before starting the job so
+        that no event is missed.
+        """
+        self._start_time = time.time()
+        self._watcher.start()
+        self._virsh = virsh.VirshPersistent(**self.virsh_dargs)
+
+    def stop(self):
+        """
+        Stop following the events and close the polling session.
+        """
+        self._watcher.stop()
+        if self._virsh is not None:
+            self._virsh.close_session()
+            self._virsh = None
+
+    def poll(self):
+        """
+        Get the job info once and record it as a sample.
+
+        :return: Dict from parse_raw_info, empty if there is no job
+        """
+        result = self._virsh.blockjob(self.vm_name, self.target,
+                                      "--info --raw", ignore_status=True)
+        info = parse_raw_info(result.stdout)
+        if 'cur' in info and 'end' in info:
+            self.samples.append((time.time() - self._start_time,
+                                 info['cur'], info['end']))
+        return info
+
+    def wait(self, timeout, states=("ready", "completed"),
+             job_required=True):
+        """
+        Wait until the job reaches one of states.
+
+        A copy or active commit job is ready once all the data is mirrored,
+        other jobs are completed once they finish.
+
+        :param timeout: Seconds to wait
+        :param states: Tuple of states of the block-job-2 event to wait for
+        :param job_required: Raise TestFail if the job disappears before
+                             reaching states, as blockcopy expects
+        :return: The state reached, None if timed out
+        :raise: TestFail if the job failed or was canceled
+        """
+        detail = "for %s (%s)$" % (self.target,
+                                   "|".join(states + ("failed", "canceled")))
+        end_time = time.time() + timeout
+        while time.time() < end_time:
+            event = self._watcher.wait_for(self.vm_name, "block-job-2",
+                                           detail, since=self._start_time,
+                                           timeout=min(self.poll_interval,
+                                                       end_time - time.time()))
+            if event is not None:
+                state = event.detail.split()[-1]
+                logging.debug("Block job on %s %s after %.1fs",
+                              self.target, state,
+                              event.time - self._start_time)
+                if state not in states:
+                    raise exceptions.TestFail("Block job on %s %s"
+                                              % (self.target, state))
+                return state
+            info = self.poll()
+            if not info:
+                if job_required:
+                    raise exceptions.TestFail("No blockjob find for '%s'"
+                                              % self.target)
+                if "completed" in states:
+                    return "completed"
+            elif "ready" in states and info['end'] and \
+                    info['cur'] == info['end']:
+                logging.debug("Block job progress up to 100%")
+                return "ready"
+        return None
+
+    def throughput(self):
+        """
+        Get the average throughput of the job from the samples.
+
+        :return: Bytes per second, 0.0 if there are not enough samples
+        """
+        if len(self.samples) < 2:
+            return 0.0
+        (first_time, first_cur, _), (last_time, last_cur, _) = \
+            self.samples[0], self.samples[-1]
+        if last_time <= first_time:
+            return 0.0
+        return (last_cur - first_cur) / float(last_time - first_time)
+
+    def series(self):
+        """
+        Get the throughput between every two samples.
+
+        :return: List of (time, bytes_per_second) tuples
+        """
+        series = []
+        for (prev_time, prev_cur, _), (cur_time, cur, _) in zip(
+                self.samples, self.samples[1:]):
+            if cur_time > prev_time:
+                series.append((cur_time,
+                               (cur - prev_cur) / float(cur_time - prev_time)))
+        return series
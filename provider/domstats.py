@@ -0,0 +1,154 @@
+"""
+Shared code for tests that need typed virsh domstats records
+"""
+
+import re
+import collections
+
+import six
+
+# Prefix of the stats returned for each stat group option of domstats
+GROUP_PREFIXES = collections.OrderedDict([('--state', 'state.'),
+                                          ('--cpu-total', 'cpu.'),
+                                          ('--balloon', 'balloon.'),
+                                          ('--vcpu', 'vcpu.'),
+                                          ('--interface', 'net.'),
+                                          ('--block', 'block.')])
+
+# Values of state.state, see virDomainState
+DOMAIN_STATES = {'nostate': 0, 'running': 1, 'blocked': 2, 'paused': 3,
+                 'shutdown': 4, 'shutoff': 5, 'crashed': 6, 'pmsuspended': 7}
+
+DOMAIN_REGEX = re.compile(r"^Domain:\s*'(.*)'$")
+
+
+def parse_value(value):
+    """
+    Convert one domstats value to int or float if possible.
+    """
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_domstats(output):
+    """
+    Parse the output of virsh domstats for any number of domains.
+
+    :param output: The domstats command output
+    :return: OrderedDict like {'vm1': {'state.state': 1, 'cpu.time': 10}}
+    """
+    records = collections.OrderedDict()
+    record = None
+    for line in output.splitlines():
+        line = line.strip()
+        match = DOMAIN_REGEX.match(line)
+        if match:
+            record = records.setdefault(match.group(1), {})
+        elif record is not None and '=' in line:
+            key, value = line.split('=', 1)
+            record[key] = parse_value(value)
+    return records
+
+
+def groups_of(options):
+    """
+    Get the stat groups requested by domstats options.
+
+    :param options: Options of virsh domstats
+    :return: List of group options, all groups when none is requested
+    """
+    groups = [option for option in options.split()
+              if option in GROUP_PREFIXES]
+    return groups or list(GROUP_PREFIXES)
+
+
+def _is_int(value):
+    return isinstance(value, six.integer_types)
+
+
+def _check_counters(record, prefix, names, errors):
+    for name in names:
+        key = prefix + name
+        if key in record and (not _is_int(record[key]) or record[key] < 0):
+            errors.append("%s=%s is not a counter" % (key, record[key]))
+
+
+def validate(record, groups):
+    """
+    Validate the stat groups of one domain record.
+
+    The state group is required for every domain, the other groups are
+    required only for active domains since libvirt skips them otherwise.
+
+    :param record: Typed stats of one domain from parse_domstats
+    :param groups: List of group options such as ['--state', '--block']
+    :return: List of error messages, empty if the record is valid
+    """
+    errors = []
+    state = record.get('state.state')
+    active = state in (DOMAIN_STATES['running'], DOMAIN_STATES['blocked'],
+                       DOMAIN_STATES['paused'])
+    if '--state' in groups:
+        if state not in DOMAIN_STATES.values():
+            errors.append("Invalid state.state=%s" % state)
+        if not _is_int(record.get('state.reason')):
+            errors.append("Invalid state.reason=%s"
+                          % record.get('state.reason'))
+    if not active:
+        return errors
+
+    if '--cpu-total' in groups:
+        if 'cpu.time' not in record:
+            errors.append("cpu.time is missing")
+        _check_counters(record, 'cpu.', ('time', 'user', 'system'), errors)
+    if '--balloon' in groups:
+        current = record.get('balloon.current')
+        maximum = record.get('balloon.maximum')
+        if not _is_int(current) or not _is_int(maximum):
+            errors.append("Invalid balloon.current=%s balloon.maximum=%s"
+                          % (current, maximum))
+        elif current > maximum:
+            errors.append("balloon.current %s is greater than "
+                          "balloon.maximum %s" % (current, maximum))
+    if '--vcpu' in groups:
+        current = record.get('vcpu.current')
+        maximum = record.get('vcpu.maximum')
+        if not _is_int(current) or not _is_int(maximum):
+            errors.append("Invalid vcpu.current=%s vcpu.maximum=%s"
+                          % (current, maximum))
+        elif current > maximum:
+            errors.append("vcpu.current %s is greater than vcpu.maximum %s"
+                          % (current, maximum))
+        else:
+            # Only the online vcpus are listed
+            online = [key for key in record
+                      if re.match(r"vcpu\.\d+\.state$", key)]
+            if len(online) != current:
+                errors.append("%d vcpus are listed while vcpu.current is %s"
+                              % (len(online), current))
+            for key in online:
+                _check_counters(record, key[:-len('state')], ('time',),
+                                errors)
+    for option, name, counters in (
+            ('--interface', 'net', ('rx.bytes', 'rx.pkts', 'rx.errs',
+                                    'rx.drop', 'tx.bytes', 'tx.pkts',
+                                    'tx.errs', 'tx.drop')),
+            ('--block', 'block', ('rd.reqs', 'rd.bytes', 'rd.times',
+                                  'wr.reqs', 'wr.bytes', 'wr.times',
+                                  'fl.reqs', 'fl.times'))):
+        if option not in groups:
+            continue
+        count = record.get('%s.count' % name)
+        if not _is_int(count):
+            errors.append("Invalid %s.count=%s" % (name, count))
+            continue
+        for index in range(count):
+            prefix = "%s.%d." % (name, index)
+            if prefix + 'name' not in record:
+                errors.append("%sname is missing" % prefix)
+            _check_counters(record, prefix, counters, errors)
+    return errors
@@ -0,0 +1,156 @@
+"""
+Shared code for tests that measure the cost of dumping loaded guests
+"""
+
+import os
+import time
+import logging
+
+from avocado.core import exceptions
+
+from virttest import data_dir
+from virttest import virsh
+
+from provider import bench_helper
+from provider import event_watcher
+from provider import fd_watcher
+
+
+def max_pause_time(watcher, vm_name, since, until):
+    """
+    Get the longest time a domain was paused, from its Suspended and
+    Resumed lifecycle events received on the host. The guest clock can
+    not tell since it stops while the guest is paused.
+
+    :param watcher: DomainEventWatcher following the lifecycle events
+    :param vm_name: Name of the domain
+    :param since: Time the dumps started at
+    :param until: Time the dumps finished at, for a pause without resume
+    :return: Seconds the guest was paused, 0 if it never was
+    """
+    pauses = []
+    suspended = None
+    for event in watcher.get_events(vm_name, "lifecycle", since):
+        if event.detail.startswith("Suspended"):
+            if suspended is None:
+                suspended = event.time
+        elif event.detail.startswith("Resumed") and suspended is not None:
+            pauses.append(event.time - suspended)
+            suspended = None
+    if suspended is not None:
+        pauses.append(until - suspended)
+    return max(pauses or [0])
+
+
+def dump_vm_timed(vm_name, dump_file, options):
+    """
+    Dump one domain and collect the statistics of the dump.
+
+    :param vm_name: Name of the domain
+    :param dump_file: Path of the dump file
+    :param options: Options of virsh dump
+    :return: Dict like {'vm': 'vm1', 'status': 0, 'wall_time': 10.0,
+             'bytes': 1073741824, 'o_direct': None}, o_direct tells whether
+             the dump file was opened with O_DIRECT for --bypass-cache
+    """
+    watcher = None
+    if "--bypass-cache" in options:
+        watcher = fd_watcher.FdFlagsWatcher(dump_file)
+        watcher.start(3600)
+    start = time.time()
+    result = virsh.dump(vm_name, dump_file, options, ignore_status=True,
+                        debug=True)
+    stats = {'vm': vm_name,
+             'status': result.exit_status,
+             'wall_time': time.time() - start,
+             'bytes': None,
+             'o_direct': None}
+    if watcher:
+        file_flags = watcher.stop()
+        if file_flags:
+            stats['o_direct'] = fd_watcher.has_flag(file_flags, os.O_DIRECT)
+    if result.exit_status:
+        logging.error("Failed to dump %s: %s", vm_name, result.stderr.strip())
+    elif os.path.exists(dump_file):
+        stats['bytes'] = os.path.getsize(dump_file)
+    return stats
+
+
+def run_dump_bench(test, params, vms):
+    """
+    Dump the loaded vms with every option set and concurrency, and report
+    the dump time, the bytes written and the guest pause time.
+
+    :param test: Avocado test object
+    :param params: Dict of test parameters
+    :param vms: List of running vms with the load started
+    """
+    option_sets = params.get("dump_bench_option_sets", "default").split()
+    concurrencies = [int(concurrency) for concurrency in
+                     params.get("dump_bench_concurrency", "1").split()]
+    dump_dir = params.get("dump_bench_dir", data_dir.get_tmp_dir())
+    results_file = params.get("dump_bench_results_file", "dump_bench.json")
+
+    watcher = event_watcher.DomainEventWatcher(event="lifecycle")
+    results = []
+    try:
+        watcher.start()
+        for name in option_sets:
+            options = params.get("dump_bench_options_%s" % name, "")
+            for concurrency in concurrencies:
+                dump_files = dict((vm.name, os.path.join(
+                    dump_dir, "%s_%s.dump" % (vm.name, name))) for vm in vms)
+                start = time.time()
+                try:
+                    dumps = bench_helper.run_in_parallel(
+                        dump_vm_timed,
+                        [(vm.name, dump_files[vm.name], options)
+                         for vm in vms], concurrency)
+                finally:
+                    for dump_file in dump_files.values():
+                        if os.path.exists(dump_file):
+                            os.remove(dump_file)
+                end = time.time()
+                elapsed = end - start
+                # The Resumed events may come a bit after virsh returns
+                time.sleep(1)
+                failed = [stats['vm'] for stats in dumps if stats['status']]
+                if failed:
+                    raise exceptions.TestFail("Failed to dump %s with '%s'"
+                                              % (failed, options))
+                cached = [stats['vm'] for stats in dumps
+                          if stats['o_direct'] is False]
+                if cached:
+                    raise exceptions.TestFail("Dump files of %s are not "
+                                              "opened with O_DIRECT with "
+                                              "'%s'" % (cached, options))
+                for stats in dumps:
+                    vm = [vm for vm in vms if vm.name == stats['vm']][0]
+                    if not vm.is_alive():
+                        raise exceptions.TestFail("VM %s is shutoff after "
+                                                  "dump" % vm.name)
+                    stats['pause_time'] = max_pause_time(watcher, vm.name,
+                                                         start, end)
+                total_bytes = sum(stats['bytes'] or 0 for stats in dumps)
+                summary = {'option_set': name,
+                           'options': options,
+                           'concurrency': concurrency,
+                           'dumps': dumps,
+                           'elapsed': elapsed,
+                           'total_bytes': total_bytes,
+                           'mbytes_per_second': total_bytes / elapsed / 10 ** 6,
+                           'max_wall_time': max(stats['wall_time']
+                                                for stats in dumps),
+                           'max_pause_time': max(stats['pause_time']
+                                                 for stats in dumps)}
+                results.append(summary)
+                logging.info("Dumped %d vms with '%s' and concurrency %d in "
+                             "%.1fs, %.1f MB/s, max guest pause %.2fs",
+                             len(vms), options, concurrency, elapsed,
+                             summary['mbytes_per_second'],
+                             summary['max_pause_time'])
+    finally:
+        watcher.stop()
+        if results:
+            bench_helper.write_results(test, results_file, results)
+    return results
@@ -0,0 +1,144 @@
+"""
+Shared code for tests that need to follow domain events through virsh event
+"""
+
+import re
+import time
+import logging
+import threading
+import collections
+
+import aexpect
+
+from avocado.core import exceptions
+
+from virttest import virsh
+
+# Newer virsh quotes the domain name
+EVENT_REGEX = re.compile(r"event '([\w-]+)' for domain '?(.+?)'?: (.*)$")
+
+# Lifecycle event which is expected after each virsh operation
+OPERATION_EVENTS = {'start': 'Started',
+                    'shutdown': 'Stopped',
+                    'destroy': 'Stopped',
+                    'suspend': 'Suspended',
+                    'resume': 'Resumed'}
+
+DomainEvent = collections.namedtuple('DomainEvent',
+                                     ['time', 'event_type', 'domain',
+                                      'detail'])
+
+
+class DomainEventWatcher(object):
+
+    """
+    Run 'virsh event --all --loop' in background and record every domain
+    event with the time it was received
+    """
+
+    def __init__(self, event=None, uri=None):
+        """
+        :param event: Event type to follow such as 'lifecycle',
+                      None means all events
+        :param uri: Connect uri of virsh
+        """
+        self.command = virsh.VIRSH_EXEC
+        if uri:
+            self.command += " -c %s" % uri
+        self.command += " event --all --loop"
+        if event:
+            self.command += " --event %s" % event
+        self.events = []
+        self.received = 0
+        self._cond = threading.Condition()
+        self._tail = None
+
+    def _on_line(self, line):
+        """
+        Parse one line of virsh event output and record the event.
+        """
+        match = EVENT_REGEX.search(line.strip())
+        if not match:
+            return
+        event = DomainEvent(time.time(), match.group(1), match.group(2),
+                            match.group(3))
+        with self._cond:
+            self.events.append(event)
+            self.received += 1
+            self._cond.notify_all()
+
+    def start(self, delay=1):
+        """
+        Start following the events.
+
+        :param delay: Seconds to wait for virsh to register the callbacks
+        """
+        logging.info("Following domain events with '%s'", self.command)
+        self._tail = aexpect.Tail(command=self.command,
+                                  output_func=self._on_line)
+        time.sleep(delay)
+        if not self._tail.is_alive():
+            raise exceptions.TestError("'%s' exited with: %s" %
+                                       (self.command,
+                                        self._tail.get_output()))
+
+    def stop(self):
+        """
+        Stop following the events.
+        """
+        if self._tail is not None:
+            self._tail.close()
+            self._tail = None
+
+    def get_events(self, domain, event_type, since=0):
+        """
+        Get the events of domain received so far without removing them.
+
+        :param domain: Name of the domain
+        :param event_type: Event type such as 'lifecycle'
+        :param since: Only get events received after this time
+        :return: List of DomainEvent in the order they were received
+        """
+        with self._cond:
+            return [event for event in self.events
+                    if event.domain == domain and
+                    event.event_type == event_type and event.time >= since]
+
+    def _pop(self, domain, event_type, detail, since):
+        """
+        Remove and return the first matching event, older events of the
+        domain are dropped as well.
+        """
+        for index, event in enumerate(self.events):
+            if (event.domain != domain or event.time < since or
+                    event.event_type != event_type or
+                    (detail and not re.search(detail, event.detail))):
+                continue
+            self.events = [old for old in self.events[:index]
+                           if old.domain != domain] + self.events[index + 1:]
+            return event
+        return None
+
+    def wait_for(self, domain, event_type, detail=None, since=0,
+                 timeout=60):
+        """
+        Wait for an event of domain.
+
+        :param domain: Name of the domain
+        :param event_type: Event type such as 'lifecycle'
+        :param detail: Regex the event detail should match, such as
+                       'Started', None means any detail
+        :param since: Only match events received after this time
+        :param timeout: Seconds to wait for the event
+        :return: The DomainEvent, None if timed out
+        """
+        end_time = time.time() + timeout
+        with self._cond:
+            while True:
+                event = self._pop(domain, event_type, detail, since)
+                if event is not None:
+                    return event
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
@@ -0,0 +1,193 @@
+"""
+Shared code for tests that check the flags a file is opened with, such as
+O_DIRECT for the --bypass-cache option of dump, save and managedsave
+"""
+
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import logging
+import threading
+
+# Events of inotify(7)
+IN_OPEN = 0x00000020
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+# The libvirt helper doing the file I/O for dump, save and restore, as
+# shown in /proc/<pid>/comm which is truncated to 15 chars
+IOHELPER = "libvirt_iohelper"
+
+_LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+def has_flag(file_flags, flag):
+    """
+    Check whether any of file_flags includes flag.
+
+    :param file_flags: List of open flags as got by FdFlagsWatcher
+    :param flag: Flag to check such as os.O_DIRECT
+    :return: True or False
+    """
+    return any(file_flag & flag == flag for file_flag in file_flags)
+
+
+class Inotify(object):
+
+    """
+    Minimal inotify instance through libc, only used to sleep until
+    something happens to the watched paths
+    """
+
+    def __init__(self):
+        self.fd = _LIBC.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path, mask):
+        """
+        Watch path for the events in mask.
+
+        :return: True if the path is watched, False if it does not exist
+        """
+        return _LIBC.inotify_add_watch(self.fd, path.encode(), mask) >= 0
+
+    def wait(self, timeout):
+        """
+        Wait for any event and drop the pending ones.
+
+        :param timeout: Seconds to wait
+        :return: True if an event happened, False if timed out
+        """
+        if not select.select([self.fd], [], [], max(timeout, 0))[0]:
+            return False
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except OSError:
+            # No more events to read
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FdFlagsWatcher(object):
+
+    """
+    Wait for a file to be created and opened, and get the open flags of the
+    file from /proc/<pid>/fdinfo of the processes having it open.
+
+    The waits are driven by inotify, so no process is spawned and nothing
+    runs until the file is created or opened.
+    """
+
+    def __init__(self, path, process_name=IOHELPER, interval=0.1):
+        """
+        :param path: Path of the file
+        :param process_name: Only check the processes of this name, None
+                             for every process
+        :param interval: Max seconds between two checks when no inotify
+                         event comes
+        """
+        self.path = os.path.realpath(path)
+        self.process_name = process_name
+        self.interval = interval
+        self.flags = []
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def fd_flags(self):
+        """
+        Get the open flags of the file in the processes having it open.
+
+        :return: List of the flags of each open fd
+        """
+        flags = []
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            proc_dir = os.path.join('/proc', pid)
+            try:
+                if self.process_name:
+                    with open(os.path.join(proc_dir, 'comm')) as comm_file:
+                        if comm_file.read().strip() != self.process_name[:15]:
+                            continue
+                for fd in os.listdir(os.path.join(proc_dir, 'fd')):
+                    if os.readlink(os.path.join(proc_dir, 'fd',
+                                                fd)) != self.path:
+                        continue
+                    with open(os.path.join(proc_dir, 'fdinfo',
+                                           fd)) as fdinfo_file:
+                        for line in fdinfo_file:
+                            if line.startswith('flags:'):
+                                flags.append(int(line.split()[1], 8))
+            except (IOError, OSError):
+                # The process exited or closed the file meanwhile
+                continue
+        return flags
+
+    def wait_for_flags(self, timeout):
+        """
+        Wait until the file is opened and get its open flags.
+
+        :param timeout: Seconds to wait
+        :return: List of the flags of each open fd, empty if timed out
+        """
+        end_time = time.time() + timeout
+        inotify = Inotify()
+        try:
+            inotify.add_watch(os.path.dirname(self.path),
+                              IN_CREATE | IN_MOVED_TO)
+            file_watched = False
+            while time.time() < end_time and not self._stop_event.is_set():
+                if os.path.exists(self.path):
+                    if not file_watched:
+                        file_watched = inotify.add_watch(self.path, IN_OPEN)
+                    flags = self.fd_flags()
+                    if flags:
+                        logging.debug("%s is opened with flags %s", self.path,
+                                      ["%o" % flag for flag in flags])
+                        return flags
+                inotify.wait(min(self.interval, end_time - time.time()))
+        finally:
+            inotify.close()
+        return []
+
+    def _watch(self, timeout):
+        self.flags = self.wait_for_flags(timeout)
+
+    def start(self, timeout):
+        """
+        Wait for the flags in background, call it before running the
+        command which opens the file.
+
+        :param timeout: Seconds to wait
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, args=(timeout,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self):
+        """
+        Wait until the flags are got or the background wait times out.
+
+        :return: List of the flags of each open fd, empty if timed out
+        """
+        self._thread.join()
+        return self.flags
+
+    def stop(self):
+        """
+        Stop the background wait, for when the file can no longer be
+        opened such as once the command is finished.
+
+        :return: List of the flags got so far
+        """
+        self._stop_event.set()
+        return self.join()
@@ -0,0 +1,113 @@
+"""
+Shared code for tests that check the libvirtd log for messages
+"""
+
+import os
+import re
+import collections
+
+# Level of a libvirtd log line such as
+# "2019-01-01 00:00:00.000+0000: 1234: error : qemuMonitorIO:719 : ..."
+LEVEL_REGEX = re.compile(r"^\S+ \S+: \d+: (debug|info|warning|error) : ")
+
+# Bytes read from the log at once
+CHUNK_SIZE = 1024 * 1024
+
+
+class LogFollower(object):
+
+    """
+    Follow a log file incrementally and index the lines matching a fixed
+    set of patterns by log level, so that every check only reads the bytes
+    logged since the previous one.
+    """
+
+    def __init__(self, path, patterns, max_lines=10):
+        """
+        :param path: Path of the log file, it may not exist yet
+        :param patterns: List of strings to look for in the log lines
+        :param max_lines: Number of last matching lines kept for each
+                          pattern and level
+        """
+        self.path = path
+        self.patterns = list(patterns)
+        self.max_lines = max_lines
+        self.offset = 0
+        self._partial = b""
+        self._inode = None
+        # {pattern: {level: count}} and {pattern: {level: deque of lines}}
+        self.counts = dict((pattern, collections.Counter())
+                           for pattern in self.patterns)
+        self.lines = dict((pattern, {}) for pattern in self.patterns)
+
+    def _index(self, line):
+        for pattern in self.patterns:
+            if pattern not in line:
+                continue
+            match = LEVEL_REGEX.match(line)
+            level = match.group(1) if match else None
+            self.counts[pattern][level] += 1
+            self.lines[pattern].setdefault(
+                level, collections.deque(maxlen=self.max_lines)).append(line)
+
+    def update(self):
+        """
+        Read the bytes logged since the last update and index the matching
+        lines, start over if the log was rotated or truncated.
+
+        :return: Number of bytes read
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0
+        if stat.st_ino != self._inode or stat.st_size < self.offset:
+            self._inode = stat.st_ino
+            self.offset = 0
+            self._partial = b""
+        read = 0
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(self.offset)
+            while True:
+                chunk = log_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                read += len(chunk)
+                lines = (self._partial + chunk).split(b"\n")
+                # The last line may still be written
+                self._partial = lines.pop()
+                for line in lines:
+                    self._index(line.decode('utf-8', 'replace'))
+        self.offset += read
+        return read
+
+    def count(self, pattern, level=None):
+        """
+        Get the number of lines logged so far matching pattern.
+
+        :param pattern: One of the patterns given at creation
+        :param level: Log level such as 'debug', 'warning' or 'error',
+                      None for any level
+        :return: Number of matching lines
+        """
+        self.update()
+        if level is None:
+            return sum(self.counts[pattern].values())
+        return self.counts[pattern][level]
+
+    def last_lines(self, pattern, level):
+        """
+        Get the last lines logged so far matching pattern at level.
+
+        :return: List of at most max_lines lines
+        """
+        self.update()
+        return list(self.lines[pattern].get(level, []))
+
+    def search(self, pattern, level=None):
+        """
+        Check whether the log contains pattern at level.
+
+        :return: True or False
+        """
+        return self.count(pattern, level) > 0
@@ -0,0 +1,90 @@
+"""
+Shared code for tests that measure the throughput of migrating guests
+"""
+
+import time
+import logging
+
+from virttest import virsh
+
+from provider import bench_helper
+from provider import migration_jobinfo
+
+
+def migrate_vm_timed(vm_name, dest_uri, options="--live", extra="",
+                     src_uri=None, timeout=None):
+    """
+    Migrate one domain and collect the statistics of the migration.
+
+    The statistics of the completed job are read on the destination host,
+    since the domain is gone from the source host after migration.
+
+    :param vm_name: Name of the domain
+    :param dest_uri: Destination uri of the migration
+    :param options: Options of virsh migrate
+    :param extra: Extra arguments of virsh migrate
+    :param src_uri: Connect uri of the source host
+    :param timeout: Seconds to wait for virsh migrate
+    :return: Dict like {'vm': 'vm1', 'status': 0, 'wall_time': 10.0,
+             'downtime': 50, 'bytes': 1073741824}, downtime is in ms
+    """
+    virsh_dargs = {'ignore_status': True, 'debug': True}
+    if src_uri:
+        virsh_dargs['uri'] = src_uri
+    if timeout:
+        virsh_dargs['timeout'] = timeout
+    start = time.time()
+    result = virsh.migrate(vm_name, dest_uri, options, extra, **virsh_dargs)
+    stats = {'vm': vm_name,
+             'status': result.exit_status,
+             'wall_time': time.time() - start,
+             'downtime': None,
+             'bytes': None}
+    if result.exit_status:
+        logging.error("Failed to migrate %s: %s", vm_name,
+                      result.stderr.strip())
+        return stats
+    jobinfo = virsh.domjobinfo("%s --completed" % vm_name, uri=dest_uri,
+                               ignore_status=True)
+    if not jobinfo.exit_status:
+        jobinfo = migration_jobinfo.parse_domjobinfo(jobinfo.stdout)
+        stats['downtime'] = jobinfo.get("Total downtime")
+        stats['bytes'] = jobinfo.get("Data processed",
+                                     jobinfo.get("Memory processed"))
+    return stats
+
+
+def migrate_vms(vm_names, dest_uri, concurrency=1, **migrate_dargs):
+    """
+    Migrate domains with at most concurrency migrations at the same time.
+
+    :param vm_names: Names of the domains
+    :param dest_uri: Destination uri of the migration
+    :param concurrency: Max number of concurrent migrations
+    :param migrate_dargs: Keywords of migrate_vm_timed
+    :return: Dict with the statistics of each migration and the aggregate
+             throughput
+    """
+    start = time.time()
+    vm_stats = bench_helper.run_in_parallel(
+        lambda vm_name: migrate_vm_timed(vm_name, dest_uri, **migrate_dargs),
+        [(vm_name,) for vm_name in vm_names], concurrency)
+    elapsed = time.time() - start
+    total_bytes = sum(stats['bytes'] or 0 for stats in vm_stats)
+    downtimes = [stats['downtime'] for stats in vm_stats
+                 if stats['downtime'] is not None]
+    summary = {'concurrency': concurrency,
+               'vms': vm_stats,
+               'failed': [stats['vm'] for stats in vm_stats
+                          if stats['status']],
+               'elapsed': elapsed,
+               'total_bytes': total_bytes,
+               'gbytes_per_second': total_bytes / elapsed / 10 ** 9,
+               'max_downtime': max(downtimes) if downtimes else None,
+               'max_wall_time': max([stats['wall_time']
+                                     for stats in vm_stats] or [0])}
+    logging.info("Migrated %d vms with concurrency %d in %.1fs, "
+                 "%.3f GB/s, max downtime %s ms", len(vm_names),
+                 concurrency, elapsed, summary['gbytes_per_second'],
+                 summary['max_downtime'])
+    return summary
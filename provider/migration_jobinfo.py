@@ -0,0 +1,151 @@
+"""
+Shared code for tests that need typed domjobinfo values or the time series
+of a migration job
+"""
+
+import re
+import time
+import logging
+import threading
+
+from virttest import virsh
+
+# Multipliers to convert the size units of virsh to bytes
+SIZE_UNITS = {'B': 1, 'bytes': 1,
+              'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3,
+              'TiB': 1024 ** 4, 'PiB': 1024 ** 5, 'EiB': 1024 ** 6}
+
+# Fields recorded by JobInfoSampler by default
+SERIES_FIELDS = ("Time elapsed", "Data processed", "Data remaining",
+                 "Memory remaining", "Memory bandwidth", "Dirty rate",
+                 "Iteration", "Expected downtime")
+
+VALUE_REGEX = re.compile(r"^(-?[0-9.]+)\s*(\S*)$")
+
+
+def parse_value(value):
+    """
+    Convert one domjobinfo value to a number in base unit.
+
+    Sizes are converted to bytes, rates of sizes to bytes/s, times are
+    kept in ms and page counts or page rates are kept as is.
+
+    :param value: Value string such as '1.234 GiB', '120.000 MiB/s',
+                  '1234 ms', '10 pages/s' or 'Unbounded'
+    :return: int or float for numbers, the stripped string otherwise
+    """
+    value = value.strip()
+    match = VALUE_REGEX.match(value)
+    if not match:
+        return value
+    number, unit = match.groups()
+    try:
+        number = int(number)
+    except ValueError:
+        number = float(number)
+    size_unit = unit[:-2] if unit.endswith("/s") else unit
+    if size_unit in SIZE_UNITS:
+        return number * SIZE_UNITS[size_unit]
+    return number
+
+
+def parse_domjobinfo(domjobinfo):
+    """
+    Parse the domjobinfo output into a dict of typed values.
+
+    :param domjobinfo: The domjobinfo command output
+    :return: Dict like {'Job type': 'Unbounded', 'Data remaining': 1048576,
+                        'Time elapsed': 1234, ...}
+    """
+    jobinfo = {}
+    for line in domjobinfo.splitlines():
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        jobinfo[key.strip()] = parse_value(value)
+    return jobinfo
+
+
+class JobInfoSampler(object):
+
+    """
+    Sample the domjobinfo of a domain periodically in background and keep
+    the samples taken while a job is active
+    """
+
+    def __init__(self, vm_name, interval=1, fields=SERIES_FIELDS,
+                 **virsh_dargs):
+        """
+        :param vm_name: Name of the domain
+        :param interval: Seconds between two samples
+        :param fields: Fields of domjobinfo to keep in each sample
+        :param virsh_dargs: Standardized virsh function API keywords
+        """
+        self.vm_name = vm_name
+        self.interval = interval
+        self.fields = fields
+        self.virsh_dargs = virsh_dargs
+        self.virsh_dargs['ignore_status'] = True
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_time = None
+
+    def sample(self):
+        """
+        Take one sample.
+
+        :return: The typed domjobinfo, None if there is no active job
+        """
+        result = virsh.domjobinfo(self.vm_name, **self.virsh_dargs)
+        if result.exit_status:
+            return None
+        jobinfo = parse_domjobinfo(result.stdout)
+        if jobinfo.get("Job type", "None") == "None":
+            return None
+        sample = {'time': time.time() - self._start_time}
+        for field in self.fields:
+            if field in jobinfo:
+                sample[field] = jobinfo[field]
+        self.samples.append(sample)
+        return jobinfo
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+        """
+        self._start_time = time.time()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and wait for the background thread.
+
+        :return: List of samples like {'time': 1.0, 'Dirty rate': 100, ...}
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        logging.debug("Got %s domjobinfo samples of %s",
+                      len(self.samples), self.vm_name)
+        return self.samples
+
+    def series(self):
+        """
+        Get the samples as one list of values per field.
+
+        :return: Dict like {'time': [0.0, 1.0], 'Dirty rate': [10, 20]},
+                 None is used where a sample misses the field
+        """
+        series = {'time': [sample['time'] for sample in self.samples]}
+        for field in self.fields:
+            series[field] = [sample.get(field) for sample in self.samples]
+        return series
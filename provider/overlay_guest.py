@@ -0,0 +1,82 @@
+"""
+Shared code for tests that need many running guests sharing the image of
+one template domain
+"""
+
+import os
+
+from avocado.utils import process
+
+from virttest import virsh
+
+
+def create_overlay_guest(vmxml, name, tmp_dir, memory=None,
+                         persistent=False):
+    """
+    Start a transient guest whose disk is a qcow2 overlay of the disk of
+    vmxml, so that many guests can share one image.
+
+    :param vmxml: VMXML of the shut off template domain
+    :param name: Name of the new guest
+    :param tmp_dir: Directory to create the overlay in
+    :param memory: Memory of the guest in KiB, None to keep the one of vmxml
+    :param persistent: Define the guest before starting it, as needed by
+                       managedsave
+    :return: Path of the overlay image
+    """
+    guest_xml = vmxml.copy()
+    guest_xml.vm_name = name
+    for elem in guest_xml.xmltreefile.findall('/uuid'):
+        guest_xml.xmltreefile.remove(elem)
+    for elem in guest_xml.xmltreefile.findall('/devices/interface/mac'):
+        guest_xml.xmltreefile.remove(elem)
+    disk_source = guest_xml.xmltreefile.find('/devices/disk/source')
+    disk_driver = guest_xml.xmltreefile.find('/devices/disk/driver')
+    overlay = os.path.join(tmp_dir, "%s.qcow2" % name)
+    process.run("qemu-img create -f qcow2 -o backing_file=%s,backing_fmt=%s "
+                "%s" % (disk_source.get('file'), disk_driver.get('type'),
+                        overlay), shell=True)
+    disk_source.set('file', overlay)
+    disk_driver.set('type', 'qcow2')
+    if memory:
+        guest_xml.max_mem = memory
+        guest_xml.current_mem = memory
+    guest_xml.xmltreefile.write()
+    if persistent:
+        virsh.define(guest_xml.xml, ignore_status=False)
+        virsh.start(name, ignore_status=False)
+    else:
+        virsh.create(guest_xml.xml, ignore_status=False)
+    return overlay
+
+
+def create_overlay_guests(vmxml, count, tmp_dir, guests, overlays):
+    """
+    Start transient overlay guests until there are count of them.
+
+    :param vmxml: VMXML of the shut off template domain
+    :param count: Number of guests wanted
+    :param tmp_dir: Directory to create the overlays in
+    :param guests: List of the guests created so far, the names of new
+                   guests are appended to it
+    :param overlays: List of the overlay images created so far, the new
+                     images are appended to it
+    """
+    while len(guests) < count:
+        name = "%s_overlay_%d" % (vmxml.vm_name, len(guests))
+        overlays.append(create_overlay_guest(vmxml, name, tmp_dir))
+        guests.append(name)
+
+
+def remove_overlay_guests(names, overlays):
+    """
+    Destroy the overlay guests, undefine the persistent ones and remove
+    their images.
+    """
+    for name in names:
+        virsh.destroy(name, ignore_status=True)
+        if virsh.domain_exists(name):
+            virsh.undefine(name, "--managed-save", ignore_status=True)
+    for overlay in overlays:
+        if os.path.exists(overlay):
+            os.remove(overlay)
@@ -0,0 +1,77 @@
+"""
+Shared code for tests that need to run virsh commands through a pool of
+persistent virsh sessions
+"""
+
+import logging
+import contextlib
+
+from six.moves import queue
+
+from virttest import virsh
+
+
+class VirshSessionPool(object):
+
+    """
+    Pool of persistent virsh sessions which can be checked out by
+    concurrent threads, each session is used by one thread at a time
+    """
+
+    def __init__(self, size=1, **virsh_dargs):
+        """
+        :param size: Number of persistent sessions, 0 means every call
+                     forks a new virsh process like the virsh module does
+        :param virsh_dargs: Standardized virsh function API keywords
+        """
+        self.size = size
+        self.virsh_dargs = virsh_dargs
+        self.virsh_dargs.setdefault('ignore_status', True)
+        self._sessions = queue.Queue()
+        self._all_sessions = []
+        for _ in range(size):
+            virsh_instance = virsh.VirshPersistent(**self.virsh_dargs)
+            self._all_sessions.append(virsh_instance)
+            self._sessions.put(virsh_instance)
+        logging.debug("Created a pool of %s persistent virsh sessions", size)
+
+    @contextlib.contextmanager
+    def session(self, timeout=None):
+        """
+        Check out a session and put it back when the block exits.
+
+        :param timeout: Seconds to wait for a free session, None means
+                        waiting forever
+        """
+        if not self.size:
+            yield virsh
+            return
+        virsh_instance = self._sessions.get(timeout=timeout)
+        try:
+            yield virsh_instance
+        finally:
+            self._sessions.put(virsh_instance)
+
+    def call(self, func_name, *args, **dargs):
+        """
+        Run a virsh function on a free session.
+
+        :param func_name: Name of the function in virsh module, such as
+                          'start' or 'domstate'
+        :return: CmdResult object
+        """
+        with self.session() as virsh_instance:
+            if virsh_instance is virsh:
+                virsh_dargs = dict(self.virsh_dargs)
+                virsh_dargs.update(dargs)
+                dargs = virsh_dargs
+            return getattr(virsh_instance, func_name)(*args, **dargs)
+
+    def close(self):
+        """
+        Close all the sessions.
+        """
+        for virsh_instance in self._all_sessions:
+            virsh_instance.close_session()
+        self._all_sessions = []
+        self.size = 0
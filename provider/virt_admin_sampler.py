@@ -0,0 +1,137 @@
+"""
+Shared code for tests that need the threadpool and clients info of a
+libvirt daemon server, once or as a time series
+"""
+
+import time
+import logging
+import threading
+import collections
+
+from virttest import virt_admin
+
+# Fields of srv-threadpool-info and srv-clients-info kept in each sample
+SAMPLE_FIELDS = ("minWorkers", "maxWorkers", "nWorkers", "freeWorkers",
+                 "prioWorkers", "jobQueueDepth", "nclients_max", "nclients",
+                 "nclients_unauth_max", "nclients_unauth")
+
+ServerInfoSample = collections.namedtuple('ServerInfoSample',
+                                          ('time',) + SAMPLE_FIELDS)
+
+
+def parse_info(output):
+    """
+    Parse the "key: value" output of virt-admin info commands.
+
+    :param output: Output of srv-threadpool-info, srv-clients-info or
+                   similar commands
+    :return: Dict like {'nWorkers': 5, 'freeWorkers': 5, ...}, numbers
+             are converted to int
+    """
+    info = {}
+    for line in output.strip().splitlines():
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        value = value.strip()
+        info[key.strip()] = int(value) if value.isdigit() else value
+    return info
+
+
+class ServerInfoSampler(object):
+
+    """
+    Poll srv-threadpool-info and srv-clients-info of a server in
+    background through one persistent virt-admin session, the latest
+    samples are kept in a ring buffer
+    """
+
+    def __init__(self, server_name="libvirtd", interval=1, maxlen=3600):
+        """
+        :param server_name: Name of the server such as 'libvirtd' or 'admin'
+        :param interval: Seconds between two samples
+        :param maxlen: Max number of samples to keep, older samples are
+                       dropped when the buffer is full
+        """
+        self.server_name = server_name
+        self.interval = interval
+        self.samples = collections.deque(maxlen=maxlen)
+        self.errors = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_time = None
+        self._virtadmin = None
+
+    def sample(self):
+        """
+        Take one sample.
+
+        :return: The ServerInfoSample, None if virt-admin failed
+        """
+        threadpool = self._virtadmin.srv_threadpool_info(self.server_name,
+                                                         ignore_status=True)
+        clients = self._virtadmin.srv_clients_info(self.server_name,
+                                                   ignore_status=True)
+        if threadpool.exit_status or clients.exit_status:
+            self.errors += 1
+            return None
+        info = parse_info(threadpool.stdout)
+        info.update(parse_info(clients.stdout))
+        sample = ServerInfoSample(time.time() - self._start_time,
+                                  *[info.get(field) for field in SAMPLE_FIELDS])
+        self.samples.append(sample)
+        return sample
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+        """
+        self._virtadmin = virt_admin.VirtadminPersistent()
+        self._start_time = time.time()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling and close the virt-admin session.
+
+        :return: List of ServerInfoSample
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._virtadmin is not None:
+            self._virtadmin.close_session()
+            self._virtadmin = None
+        logging.debug("Got %s samples of server %s, %s failed",
+                      len(self.samples), self.server_name, self.errors)
+        return list(self.samples)
+
+    def series(self):
+        """
+        Get the samples as one list of values per field.
+
+        :return: Dict like {'time': [0.0, 1.0], 'jobQueueDepth': [0, 3]}
+        """
+        samples = list(self.samples)
+        return dict((field, [getattr(sample, field) for sample in samples])
+                    for field in ServerInfoSample._fields)
+
+    def peak(self, field):
+        """
+        Get the max value of a field in the samples.
+
+        :param field: Name of the field such as 'jobQueueDepth'
+        :return: The max value, None if there is no sample
+        """
+        values = [getattr(sample, field) for sample in self.samples
+                  if getattr(sample, field) is not None]
+        return max(values) if values else None
@@ -0,0 +1,126 @@
+"""
+Shared code for tests that check whether domain XMLs stay the same before
+and after an operation, such as a libvirtd restart
+"""
+
+import difflib
+import hashlib
+import logging
+
+from xml.etree import ElementTree
+
+from provider import bench_helper
+from provider import virsh_pool
+
+# Parts of the domain XML which may change without the domain changing,
+# "path" ignores the elements and "path@attr" ignores an attribute
+DEFAULT_IGNORE = ("devices/channel/target@state",)
+
+
+def parse_ignore(ignore_str):
+    """
+    Parse the ignored parts from a space separated string.
+
+    :param ignore_str: String like "devices/channel/target@state seclabel",
+                       None or empty string means the default parts
+    :return: List of (path, attribute) tuples, attribute is None when the
+             whole elements are ignored
+    """
+    ignore = []
+    for item in (ignore_str.split() if ignore_str else DEFAULT_IGNORE):
+        path, _, attr = item.partition('@')
+        ignore.append((path, attr or None))
+    return ignore
+
+
+def _canonical_lines(elem, depth, lines):
+    attrs = "".join(' %s="%s"' % item for item in sorted(elem.attrib.items()))
+    lines.append("%s<%s%s>%s" % ("  " * depth, elem.tag, attrs,
+                                 (elem.text or "").strip()))
+    for child in elem:
+        _canonical_lines(child, depth + 1, lines)
+
+
+def canonicalize(xml_str, ignore=None):
+    """
+    Convert a domain XML to a canonical text with the attributes sorted,
+    the whitespaces stripped and the ignored parts removed.
+
+    :param xml_str: The domain XML
+    :param ignore: List of (path, attribute) tuples from parse_ignore,
+                   None means the default parts
+    :return: The canonical text, one element per line
+    """
+    if ignore is None:
+        ignore = parse_ignore(None)
+    root = ElementTree.fromstring(xml_str.strip())
+    for path, attr in ignore:
+        matches = root.findall("./%s" % path)
+        if attr:
+            for elem in matches:
+                elem.attrib.pop(attr, None)
+            continue
+        for parent in list(root.iter()):
+            for child in list(parent):
+                if child in matches:
+                    parent.remove(child)
+    lines = []
+    _canonical_lines(root, 0, lines)
+    return "\n".join(lines)
+
+
+def snapshot(vm_names, options="", ignore=None, concurrency=8,
+             **virsh_dargs):
+    """
+    Fetch and canonicalize the XMLs of domains.
+
+    :param vm_names: Names of the domains
+    :param options: Options of virsh dumpxml such as '--inactive'
+    :param ignore: List of (path, attribute) tuples from parse_ignore
+    :param concurrency: Number of virsh sessions to fetch the XMLs with
+    :param virsh_dargs: Standardized virsh function API keywords
+    :return: Dict like {vm_name: (digest, canonical_xml)}, the value is
+             None when the XML can not be fetched
+    """
+    pool = virsh_pool.VirshSessionPool(min(concurrency, len(vm_names)),
+                                       **virsh_dargs)
+
+    def _fetch(vm_name):
+        result = pool.call("dumpxml", vm_name, extra=options)
+        if result.exit_status:
+            logging.error("Failed to get the XML of %s: %s", vm_name,
+                          result.stderr.strip())
+            return None
+        canonical = canonicalize(result.stdout, ignore)
+        return hashlib.md5(canonical.encode()).hexdigest(), canonical
+
+    try:
+        xmls = bench_helper.run_in_parallel(
+            _fetch, [(vm_name,) for vm_name in vm_names], concurrency)
+    finally:
+        pool.close()
+    return dict(zip(vm_names, xmls))
+
+
+def compare(before, after):
+    """
+    Compare two snapshots and diff the domains whose digest changed.
+
+    :param before: Snapshot taken before the operation
+    :param after: Snapshot taken after the operation
+    :return: Dict like {vm_name: diff_text} of the changed domains
+    """
+    changed = {}
+    for vm_name, old in before.items():
+        new = after.get(vm_name)
+        if old is None or new is None:
+            changed[vm_name] = ("XML of %s is missing %s the operation" %
+                                (vm_name, "before" if old is None
+                                 else "after"))
+        elif old[0] != new[0]:
+            changed[vm_name] = "\n".join(
+                difflib.unified_diff(old[1].splitlines(),
+                                     new[1].splitlines(),
+                                     "before", "after", lineterm=''))
+    logging.debug("%d of %d domain XMLs changed", len(changed), len(before))
+    return changed